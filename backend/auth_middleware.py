@@ -5,37 +5,94 @@ from fastapi import HTTPException, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from supabase_config import supabase_client
 import logging
-from typing import Optional, Dict, Any
+import base64
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 
 logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
 
+# Verified users are cached for a short time so authenticated requests don't
+# pay a Supabase round-trip each. Entries never outlive the token's own `exp`.
+TOKEN_CACHE_TTL = 30  # seconds
+TOKEN_CACHE_MAXSIZE = 10000
+
 class AuthMiddleware:
     def __init__(self):
         self.supabase = supabase_client
+        # sha256(token)[:32] -> (expires_at, user info without the raw token)
+        self._token_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    @staticmethod
+    def _cache_key(token: str) -> str:
+        """Hash the token so raw JWTs are never kept in memory as cache keys"""
+        return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+    @staticmethod
+    def _token_expiry(token: str) -> Optional[float]:
+        """Read the `exp` claim from the JWT payload (signature is checked by Supabase on miss)"""
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+        except Exception:
+            return None
+
+    def _get_user(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Resolve a token to user information, using the verification cache
+        and falling back to Supabase on a miss
+        """
+        key = self._cache_key(token)
+        now = time.time()
+
+        entry = self._token_cache.get(key)
+        if entry is not None:
+            expires_at, user = entry
+            if expires_at > now:
+                self._token_cache.move_to_end(key)
+                return {**user, "token": token}
+            del self._token_cache[key]
+
+        response = self.supabase.auth.get_user(token)
+        if not response.user:
+            return None
+
+        user = {
+            "user_id": response.user.id,
+            "email": response.user.email,
+            "user_metadata": response.user.user_metadata,
+            "app_metadata": response.user.app_metadata,
+        }
+        logger.info(f"User authenticated: {response.user.id}")
+
+        ttl = TOKEN_CACHE_TTL
+        token_exp = self._token_expiry(token)
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - now)
+        if ttl > 0:
+            self._token_cache[key] = (now + ttl, user)
+            if len(self._token_cache) > TOKEN_CACHE_MAXSIZE:
+                self._token_cache.popitem(last=False)
+
+        return {**user, "token": token}
 
     async def verify_token(self, credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
         """
         Verify JWT token and return user information
         """
         try:
-            # Verify the JWT token with Supabase
-            response = self.supabase.auth.get_user(credentials.credentials)
+            # Verify the JWT token with Supabase (cached)
+            user = self._get_user(credentials.credentials)
             
-            if not response.user:
+            if not user:
                 raise HTTPException(status_code=401, detail="Invalid token")
             
-            user = response.user
-            logger.info(f"User authenticated: {user.id}")
-            
-            return {
-                "user_id": user.id,
-                "email": user.email,
-                "user_metadata": user.user_metadata,
-                "app_metadata": user.app_metadata,
-                "token": credentials.credentials
-            }
+            return user
             
         except Exception as e:
             logger.error(f"Token verification failed: {str(e)}")
@@ -51,15 +108,7 @@ class AuthMiddleware:
         
         token = auth_header.split(" ")[1]
         try:
-            response = self.supabase.auth.get_user(token)
-            if response.user:
-                return {
-                    "user_id": response.user.id,
-                    "email": response.user.email,
-                    "user_metadata": response.user.user_metadata,
-                    "app_metadata": response.user.app_metadata,
-                    "token": token
-                }
+            return self._get_user(token)
         except Exception as e:
             logger.warning(f"Optional auth failed: {str(e)}")
         
@@ -0,0 +1,77 @@
+"""
+Censoring jobs for the /process endpoint. They run in a worker process pool
+(see server.py) so a long encode never blocks the API's event loop; each
+worker loads YOLOE once, in init_worker.
+
+yolo_e is only imported inside the jobs, so the API process can reference
+them without loading torch / ultralytics itself.
+"""
+import os
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+# Warm the model up in init_worker, so the first request does not pay for
+# engine / CUDA graph setup; YOLOE_WARMUP=0 skips it (faster worker start)
+YOLOE_WARMUP = os.getenv("YOLOE_WARMUP", "1") != "0"
+
+def init_worker():
+    """Pool initializer: load YOLOE (engine, text embeddings) once per worker"""
+    from scripts.yolo_e import get_model, warmup_model
+    model = get_model()
+    if YOLOE_WARMUP:
+        warmup_model(model)
+
+def ping() -> int:
+    """
+    Near no-op job, run once a worker has finished init_worker. Returns the
+    worker's pid; the short hold lets concurrent pings spread across workers.
+    """
+    time.sleep(0.05)
+    return os.getpid()
+
+def censor_video(in_path: str, out_path: str, detect_every: int = 3, batch_size: Optional[int] = None) -> int:
+    """
+    Censors the video at `in_path` into `out_path`; `batch_size` defaults to
+    YOLOE_BATCH. Returns the size of `out_path` (0 if nothing was written).
+    """
+    from scripts.yolo_e import YOLOE_BATCH, get_model, run_video_censor
+    run_video_censor(
+        model=get_model(),
+        in_video_path=in_path,
+        out_video_path=out_path,
+        imgsz=640,
+        conf=0.25,
+        pixel_size=14,
+        verbose=False,
+        detect_every=detect_every,
+        batch_size=batch_size or YOLOE_BATCH,
+    )
+    try:
+        return os.stat(out_path).st_size
+    except FileNotFoundError:
+        return 0
+
+def censor_image(img_path: str) -> Tuple[int, bytes]:
+    """
+    Pixelates `img_path`; returns (number of detections, the result encoded in
+    the input's format). Nothing is written to disk.
+    """
+    import cv2
+    from scripts.yolo_e import get_model, run_image_pixelate
+    in_path = Path(img_path)
+    out_img, detections = run_image_pixelate(
+        model=get_model(),
+        img_path=img_path,
+        outdir=str(in_path.parent),
+        imgsz=640,
+        conf=0.25,
+        verbose=False,
+        padding_px=2,
+        pixel_size=10,
+        save=False
+    )
+    ok, encoded = cv2.imencode(in_path.suffix, out_img)
+    if not ok:
+        raise IOError(f"Failed to encode blurred image as {in_path.suffix}")
+    return len(detections), encoded.tobytes()
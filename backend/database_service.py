@@ -2,13 +2,23 @@
 Database service for managing user data with Supabase
 """
 from supabase_config import supabase_client
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator
 import logging
-from datetime import datetime
+import itertools
+from datetime import datetime, timezone
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Rows per PostgREST request for bulk writes (keeps payloads well under ~1MB)
+BULK_CHUNK_SIZE = 1000
+
+def _chunked(rows: Iterable[Dict[str, Any]], size: int = BULK_CHUNK_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Yield lists of at most `size` rows"""
+    it = iter(rows)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
 class DatabaseService:
     def __init__(self):
         self.supabase = supabase_client
@@ -16,11 +26,12 @@ class DatabaseService:
     async def create_user_profile(self, user_id: str, email: str, **kwargs) -> Dict[str, Any]:
         """Create a new user profile"""
         try:
+            now = datetime.now(timezone.utc).isoformat()
             profile_data = {
                 "id": user_id,
                 "email": email,
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat(),
+                "created_at": now,
+                "updated_at": now,
                 **kwargs
             }
             
@@ -45,7 +56,7 @@ class DatabaseService:
         """Update user profile"""
         try:
             update_data = {
-                "updated_at": datetime.utcnow().isoformat(),
+                "updated_at": datetime.now(timezone.utc).isoformat(),
                 **kwargs
             }
             
@@ -62,12 +73,13 @@ class DatabaseService:
     async def create_user_preferences(self, user_id: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
         """Create user preferences"""
         try:
+            now = datetime.now(timezone.utc).isoformat()
             prefs_data = {
                 "id": str(uuid.uuid4()),
                 "user_id": user_id,
                 "preferences": preferences,
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
+                "created_at": now,
+                "updated_at": now
             }
             
             result = self.supabase.table("user_preferences").insert(prefs_data).execute()
@@ -90,13 +102,59 @@ class DatabaseService:
         try:
             result = self.supabase.table("user_preferences").update({
                 "preferences": preferences,
-                "updated_at": datetime.utcnow().isoformat()
+                "updated_at": datetime.now(timezone.utc).isoformat()
             }).eq("user_id", user_id).execute()
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error updating user preferences: {str(e)}")
             return None
 
+    async def bulk_update_user_profiles(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Upsert many user profiles, one request per BULK_CHUNK_SIZE rows.
+        Each row must include "id". For very large backfills (>100k rows) load
+        through a direct Postgres connection with COPY instead.
+        """
+        try:
+            now = datetime.now(timezone.utc).isoformat()
+            written: List[Dict[str, Any]] = []
+            for chunk in _chunked({**row, "updated_at": now} for row in rows):
+                result = self.supabase.table("user_profiles").upsert(chunk, on_conflict="id").execute()
+                written.extend(result.data or [])
+            logger.info(f"Upserted {len(written)} user profiles")
+            return written
+        except Exception as e:
+            logger.error(f"Error bulk updating user profiles: {str(e)}")
+            raise
+
+    async def bulk_create_user_preferences(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Create many user preferences, one request per BULK_CHUNK_SIZE rows.
+        Each row needs "user_id" and "preferences". For very large backfills
+        (>100k rows) load through a direct Postgres connection with COPY instead.
+        """
+        try:
+            now = datetime.now(timezone.utc).isoformat()
+            prefs_rows = (
+                {
+                    "id": str(uuid.uuid4()),
+                    "user_id": row["user_id"],
+                    "preferences": row["preferences"],
+                    "created_at": now,
+                    "updated_at": now
+                }
+                for row in rows
+            )
+            written: List[Dict[str, Any]] = []
+            for chunk in _chunked(prefs_rows):
+                result = self.supabase.table("user_preferences").insert(chunk).execute()
+                written.extend(result.data or [])
+            logger.info(f"Created {len(written)} user preferences")
+            return written
+        except Exception as e:
+            logger.error(f"Error bulk creating user preferences: {str(e)}")
+            raise
+
     # Note: User stats are now calculated from Supabase Storage files
     # in the server.py endpoints, eliminating the need for a separate table
 
@@ -1,13 +1,34 @@
 import cv2
 import numpy as np
-import easyocr
 import re
-import torch
+import functools
+import os
+import regex
+import queue
+import threading
+import logging
+from fractions import Fraction
+from ocr_singleton import get_reader, classify_pii
 
-# Load OCR model
-print("Loading EasyOCR model...")
-reader = easyocr.Reader(["en"], gpu=True)
-print("EasyOCR model loaded successfully")
+# Optional: PyAV for hardware (NVENC) / libx264 encoding
+try:
+    import av
+    AV_AVAILABLE = True
+except Exception:
+    AV_AVAILABLE = False
+
+# Optional: Numba for the single-pass pixelate kernel
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except Exception:
+    NUMBA_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Below DEBUG: per-detection messages inside the per-frame loop
+TRACE = 5
+logging.addLevelName(TRACE, "TRACE")
 
 # 1) REGEX patterns for PII detection
 PATTERNS = {
@@ -17,42 +38,158 @@ PATTERNS = {
     "alphanum":    re.compile(r"(?=\w*\d)(?=\w*[A-Za-z])[A-Za-z0-9]{3,}"),
     "numeric":     re.compile(r"\b\d{4,}\b")
 }
-def looks_sensitive(text, nlp=False):
-    if nlp:
-        # Default to all non-O labels for now
-        sensitive_labels = set(model.config.id2label.values()) - {'O'}
-        
-        # Tokenize input text
-        inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        # Get the model predictions
-        with torch.no_grad():
-            outputs = model(**inputs)
-        
-        # Get the predicted labels
-        predictions = torch.argmax(outputs.logits, dim=-1)
-        
-        # Check if any specified sensitive labels exist
-        for prediction in predictions[0]:
-            label_id = prediction.item()
-            if label_id != model.config.label2id['O']:
-                label_name = model.config.id2label[label_id]
-                if label_name in sensitive_labels:
-                    print(f"PII NLP Model detected '{text}' as {label_name}")
-                    return True
-        
-        return False
+# One alternation over all classes: a single search rules out the (common)
+# tokens with no PII. It only answers yes/no: its match is the leftmost one,
+# which can belong to any class, so the label comes from _regex_class
+PATTERN_COMBINED = re.compile("|".join(f"(?P<{k}>{p.pattern})" for k, p in PATTERNS.items()))
+
+# Fuzzy variants tolerating OCR misreads ({e<=k} errors), plus SG/network/ID formats
+PATTERNS_FUZZY = {
+    "credit_card": regex.compile(
+        r"\b(?:(?:\d{4}[-\s]?){3}\d{4}){e<=2}\b",
+        regex.V1
+    ),
+
+    "email": regex.compile(
+        # one error in the local part and one in the domain name; the "@" and
+        # the "." before the TLD must be read exactly (with edits allowed there,
+        # any word matches)
+        r"(?:[A-Za-z0-9._%+-]+){e<=1}@(?:[A-Za-z0-9.-]+){e<=1}\.[A-Za-z]{2,}",
+        regex.V1
+    ),
+
+    "phone": regex.compile(
+        # no error budget: the pattern already takes any two digits, and one
+        # edit would let any letter stand in for a digit
+        r"(?:\+?\d{1,3}[-.\s]?)?(?:\(?\d{1,4}\)?[-.\s]?){1,4}\d{1,4}",
+        regex.V1
+    ),
+
+    "nric_fin": regex.compile(
+        # 9 chars total, allow 1 mis-read
+        r"\b(?:[STFG]\d{7}[A-Z]){e<=1}\b",
+        regex.V1 | regex.IGNORECASE
+    ),
+
+    "uen": regex.compile(
+        # 9–10 chars, allow 1 error
+        r"\b(?:(?:\d{9}|\d{8}[A-Z]|[STFG]\d{7}[A-Z])){e<=1}\b",
+        regex.V1 | regex.IGNORECASE
+    ),
+
+    "sg_phone": regex.compile(
+        # 8 digits or +65 prefix, allow 1 error
+        r"\b(?:(?:\+65[-.\s]?)?[3698]\d{3}[-.\s]?\d{4}){e<=1}\b",
+        regex.V1
+    ),
+
+    "sg_postal": regex.compile(
+        # 6 digits, allow 1 error
+        r"\b(?:\d{6}){e<=1}\b",
+        regex.V1
+    ),
 
+    "passport": regex.compile(
+        # 6–9 chars, allow 1 error
+        r"\b(?:[A-Z]{1,2}\d{5,7}){e<=1}\b",
+        regex.V1 | regex.IGNORECASE
+    ),
+
+    "iban": regex.compile(
+        # 15–34 chars, allow up to 2 errors
+        r"\b(?:[A-Z]{2}\d{2}[A-Z0-9]{4}\d{7}(?:[A-Z0-9]?){0,16}){e<=2}\b",
+        regex.V1
+    ),
+
+    "swift": regex.compile(
+        # 8 or 11 chars, exact: with an error, any all-caps word of 7-12
+        # letters (RESTAURANT) would match
+        r"\b[A-Z]{4}[A-Z]{2}[A-Z0-9]{2}(?:[A-Z0-9]{3})?\b",
+        regex.V1
+    ),
+
+    "ipv4": regex.compile(
+        # ~15 chars, allow 1 error in octets or dots
+        r"\b(?:(?:25[0-5]|2[0-4]\d|[01]?\d?\d)\."
+        r"(?:25[0-5]|2[0-4]\d|[01]?\d?\d)\."
+        r"(?:25[0-5]|2[0-4]\d|[01]?\d?\d)\."
+        r"(?:25[0-5]|2[0-4]\d|[01]?\d?\d)){e<=1}\b",
+        regex.V1
+    ),
+
+    "ipv6": regex.compile(
+        # allow 2 errors in hex groups or colons
+        r"\b(?:(?:[A-F0-9]{1,4}:){7}[A-F0-9]{1,4}){e<=2}\b",
+        regex.V1 | regex.IGNORECASE
+    ),
+
+    "mac_address": regex.compile(
+        # ~17 chars, allow 2 errors in hex or separators
+        r"\b(?:(?:[0-9A-F]{2}[:-]){5}[0-9A-F]{2}){e<=2}\b",
+        regex.V1 | regex.IGNORECASE
+    ),
+
+    "uuid": regex.compile(
+        # 36 chars with hyphens, allow 3 errors
+        r"\b(?:[0-9a-fA-F]{8}\-(?:[0-9a-fA-F]{4}\-){3}[0-9a-fA-F]{12}){e<=3}\b",
+        regex.V1
+    ),
+
+    "vin": regex.compile(
+        # 17 alnum, allow 2 errors
+        r"\b(?:[A-HJ-NPR-Z0-9]{17}){e<=2}\b",
+        regex.V1
+    ),
+    "alphanum":    regex.compile(r"(?=\w*\d)(?=\w*[A-Za-z])[A-Za-z0-9]{3,}", regex.V1),
+    "numeric":     regex.compile(r"\b\d{4,}\b", regex.V1),
+}
+
+# Fuzzy counterpart of PATTERN_COMBINED (a yes/no prefilter; labels come from
+# the dict order). Per-pattern IGNORECASE is kept via scoped inline flags.
+PATTERN_FUZZY_COMBINED = regex.compile("|".join(
+    f"(?P<{k}>(?i:{p.pattern}))" if p.flags & regex.IGNORECASE else f"(?P<{k}>{p.pattern})"
+    for k, p in PATTERNS_FUZZY.items()
+), regex.V1)
+
+@functools.lru_cache(maxsize=4096)
+def _regex_class(t, fuzzy=False):
+    """
+    PII class for stripped text `t`, or None. Cached because the same tokens
+    are OCR'd again in consecutive video frames.
+    """
+    combined, patterns = (PATTERN_FUZZY_COMBINED, PATTERNS_FUZZY) if fuzzy else (PATTERN_COMBINED, PATTERNS)
+    if not combined.search(t):
+        return None
+    # The first class in dict (priority) order that matches anywhere in `t`
+    return next((label for label, pat in patterns.items() if pat.search(t)), None)
+
+def looks_sensitive(text, nlp=False, fuzzy=False):
+    """
+    Returns the PII class label if `text` is sensitive, otherwise None.
+    `fuzzy` matches against PATTERNS_FUZZY instead of PATTERNS.
+    """
+    if nlp:
+        return looks_sensitive_batch([text], nlp=True)[0]
     else:
         t = text.strip()
         if not t:
-            return False
-        for pat in PATTERNS.values():
-            if pat.search(t):
-                print(f"REGEX detected: '{text}' as {pat}")
-                return True
-        return False
+            return None
+        label = _regex_class(t, fuzzy)
+        if label is not None:
+            logger.log(TRACE, "REGEX detected: %r as %s", text, label)
+        return label
+
+def looks_sensitive_batch(texts, nlp=False, fuzzy=False):
+    """
+    looks_sensitive for a list of texts; with `nlp` they share one model call.
+    """
+    if not nlp:
+        return [looks_sensitive(t, fuzzy=fuzzy) for t in texts]
+    labels = classify_pii(texts)
+    for text, label in zip(texts, labels):
+        if label is not None:
+            logger.log(TRACE, "PII NLP Model detected %r as %s", text, label)
+    return labels
 
 # 2) Simple IoU
 def compute_iou(a, b):
@@ -63,59 +200,89 @@ def compute_iou(a, b):
     inter = (xB - xA) * (yB - yA)
     return inter / float(a[2]*a[3] + b[2]*b[3] - inter)
 
+def compute_iou_matrix(a, b):
+    """
+    Pairwise IoU between (N,4) and (M,4) arrays of (x,y,w,h) boxes -> (N,M).
+    """
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 0] + a[:, None, 2], b[None, :, 0] + b[None, :, 2])
+    y2 = np.minimum(a[:, None, 1] + a[:, None, 3], b[None, :, 1] + b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
 # 3) Tracker for persistent redaction
 class PiiTracker:
     def __init__(self, max_lost=8, iou_thresh=0.3):
         self.max_lost = max_lost
         self.iou_thresh = iou_thresh
-        self.tracks = {}
+        # Track state as parallel arrays (one row per live track)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.bboxes = np.empty((0, 4), dtype=np.int32)   # (x,y,w,h)
+        self.lost = np.empty(0, dtype=np.int16)
+        self.labels = []
         self.next_id = 0
 
     def update(self, detections):
         """
-        detections: list of ((x,y,w,h), text)
+        detections: list of ((x,y,w,h), label)
         """
-        new_tracks = {}
-        used = set()
-
-        # 3.1 Match detections to existing tracks
-        for det_bbox, det_text in detections:
-            best_id, best_iou = None, 0.0
-            for tid, data in self.tracks.items():
-                iou = compute_iou(det_bbox, data['bbox'])
-                if iou > best_iou:
-                    best_id, best_iou = tid, iou
-            if best_iou >= self.iou_thresh:
-                # update existing track
-                new_tracks[best_id] = {
-                    'bbox': det_bbox,
-                    'text': det_text,
-                    'lost': 0
-                }
-                used.add(best_id)
-            else:
-                # start a fresh track
-                new_tracks[self.next_id] = {
-                    'bbox': det_bbox,
-                    'text': det_text,
-                    'lost': 0
-                }
-                self.next_id += 1
-
-        # 3.2 Age out tracks not matched this frame
-        for tid, data in self.tracks.items():
-            if tid not in used:
-                data['lost'] += 1
-                if data['lost'] <= self.max_lost:
-                    new_tracks[tid] = data
-
-        self.tracks = new_tracks
+        det = np.array([b for b, _ in detections], dtype=np.int32).reshape(-1, 4)
+        det_labels = [t for _, t in detections]
+
+        # 3.1 Match detections to existing tracks: row of the best-IoU track
+        # per detection, or -1 for none
+        match = np.full(len(det), -1, dtype=np.int64)
+        if len(det) and len(self.ids):
+            iou = compute_iou_matrix(det, self.bboxes)
+            best = iou.argmax(axis=1)
+            ok = iou[np.arange(len(det)), best] >= self.iou_thresh
+            match[ok] = best[ok]
+
+        # update existing tracks (the last detection wins if several match one)
+        self.lost += 1
+        hit = np.flatnonzero(match >= 0)
+        rows = match[hit]
+        self.bboxes[rows] = det[hit]
+        self.lost[rows] = 0
+        for r, i in zip(rows.tolist(), hit.tolist()):
+            self.labels[r] = det_labels[i]
+
+        # start fresh tracks for the rest
+        fresh = np.flatnonzero(match < 0)
+        if len(fresh):
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + len(fresh))])
+            self.bboxes = np.concatenate([self.bboxes, det[fresh]])
+            self.lost = np.concatenate([self.lost, np.zeros(len(fresh), dtype=np.int16)])
+            self.labels.extend(det_labels[i] for i in fresh.tolist())
+            self.next_id += len(fresh)
+
+        # 3.2 Age out tracks not matched for too long
+        keep = self.lost <= self.max_lost
+        if not keep.all():
+            self.ids = self.ids[keep]
+            self.bboxes = self.bboxes[keep]
+            self.lost = self.lost[keep]
+            self.labels = [t for t, k in zip(self.labels, keep.tolist()) if k]
 
     def active(self):
-        """Return list of (bbox, text) for current tracks."""
-        return [(d['bbox'], d['text']) for d in self.tracks.values()]
+        """Return list of (bbox, label) for current tracks."""
+        return list(zip(map(tuple, self.bboxes.tolist()), self.labels))
 
 # 4) Redaction helpers
+def ocr_boxes_to_xywh(results, pad, W, H):
+    """
+    Padded, frame-clipped (x,y,w,h) boxes for every OCR quad at once -> (N,4) int array.
+    """
+    quads = np.array([r[0] for r in results], dtype=np.int32).reshape(-1, 4, 2)
+    xs, ys = quads[..., 0], quads[..., 1]
+    x = np.maximum(0, xs.min(axis=1) - pad)
+    y = np.maximum(0, ys.min(axis=1) - pad)
+    w = np.minimum(W, xs.max(axis=1) + pad) - x
+    h = np.minimum(H, ys.max(axis=1) + pad) - y
+    return np.stack([x, y, w, h], axis=1)
+
 def pixelate(roi, blocks=8):
     h, w = roi.shape[:2]
     small = cv2.resize(roi, (blocks, blocks), interpolation=cv2.INTER_LINEAR)
@@ -124,6 +291,68 @@ def pixelate(roi, blocks=8):
 def blackout(roi):
     return np.zeros_like(roi)
 
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def _pixelate_masked_nb(frame, out, mask, block):
+        """
+        Pixelate `frame` into `out` on a frame-aligned `block` grid, in one pass:
+        each block touching `mask` gets its mean colour on its masked pixels.
+        """
+        H, W = mask.shape
+        for by in prange((H + block - 1) // block):
+            y0 = by * block
+            y1 = min(y0 + block, H)
+            for x0 in range(0, W, block):
+                x1 = min(x0 + block, W)
+                if not mask[y0:y1, x0:x1].any():
+                    continue
+                n = (y1 - y0) * (x1 - x0)
+                for c in range(3):
+                    s = 0
+                    for y in range(y0, y1):
+                        for x in range(x0, x1):
+                            s += int(frame[y, x, c])
+                    m = (s + n // 2) // n
+                    for y in range(y0, y1):
+                        for x in range(x0, x1):
+                            if mask[y, x]:
+                                out[y, x, c] = m
+
+def redact_regions(frame, boxes, redaction_mode="pixelate", blur_ksize=(51,51), pixel_size=16, out=None):
+    """
+    Redact every (x,y,w,h) box of `frame` in one full-frame pass: the redacted
+    frame is built once and composited through a mask of all boxes.
+    The result is written to `out` when given (reused across frames),
+    otherwise to a new copy of `frame`.
+    """
+    if out is None:
+        out = frame.copy()
+    else:
+        np.copyto(out, frame)
+    if not boxes:
+        return out
+
+    H, W = frame.shape[:2]
+    mask = np.zeros((H, W), dtype=bool)
+    for (x, y, w, h) in boxes:
+        mask[y:y+h, x:x+w] = True
+
+    if redaction_mode == "blur":
+        redacted = cv2.GaussianBlur(frame, blur_ksize, 0)
+    elif redaction_mode == "pixelate" and NUMBA_AVAILABLE:
+        # Only the blocks under the mask are averaged, no full-frame resize pair
+        _pixelate_masked_nb(np.ascontiguousarray(frame), out, mask, pixel_size)
+        return out
+    elif redaction_mode == "pixelate":
+        small = cv2.resize(frame, (max(1, W // pixel_size), max(1, H // pixel_size)), interpolation=cv2.INTER_LINEAR)
+        redacted = cv2.resize(small, (W, H), interpolation=cv2.INTER_NEAREST)
+    else:  # blackout
+        out[mask] = 0
+        return out
+
+    np.copyto(out, redacted, where=mask[:, :, None])
+    return out
+
 # 5) Frame‐level censoring with persistence
 def censor_frame_consistent(
     frame,
@@ -135,55 +364,76 @@ def censor_frame_consistent(
     blur_ksize=(51,51),
     ocr_params={"text_threshold": 0.5, "low_text": 0.6, "add_margin": 0.2, "contrast_ths": 0.1, "adjust_contrast": 0.5},
     debug=False,
-    nlp=False
+    nlp=False,
+    ocr_results=None,
+    pixel_size=16,
+    out_buf=None,
+    mode="redact",
+    fuzzy=False
 ):
     """
     1) OCR→detect sensitive bboxes
     2) tracker.update() to smooth over missing frames
     3) redact all active tracks each frame
     4) debug overlays if requested
+
+    With mode="bbox" nothing is drawn: steps 3-4 are replaced by returning
+    the active tracks as a per-class dict, e.g.
+      { "email": [[x,y,w,h], …], "phone": [[…], …], … }
+    `fuzzy` matches OCR text against PATTERNS_FUZZY.
+
+    `reader` may be None to use the shared lazily loaded reader.
+    `ocr_results` may carry this frame's precomputed reader output (e.g. from
+    a batched OCR call); otherwise OCR runs here.
+    `out_buf` is an optional frame-sized buffer the redacted frame is written
+    into, so video loops avoid one frame allocation per frame.
     """
     H, W = frame.shape[:2]
 
-    print(f"Starting OCR on frame {frame.shape}")
-
     # 5.1 Detect PII boxes this frame
     dets = []
-    results = reader.readtext(frame, detail=1, paragraph=False, **ocr_params)
-    print(f"OCR completed, found {len(results)} text regions")
+    if ocr_results is None:
+        if reader is None:
+            reader = get_reader()
+        logger.debug("Starting OCR on frame %s", frame.shape)
+        results = reader.readtext(frame, detail=1, paragraph=False, **ocr_params)
+    else:
+        results = ocr_results
+    logger.debug("OCR completed, found %d text regions", len(results))
 
-    for bbox_pts, text, prob in results:
-        if prob < min_prob:
-            continue
-        if not looks_sensitive(text, nlp):
-            continue
+    # padded boxes for all confident regions in one pass
+    probs = np.array([r[2] for r in results], dtype=np.float32)
+    keep = probs >= min_prob
+    boxes = ocr_boxes_to_xywh(results, pad, W, H)[keep].tolist()
+    texts = [r[1] for r, k in zip(results, keep) if k]
 
-        pts = np.array(bbox_pts).astype(int)
-        x1, y1 = pts[:,0].min(), pts[:,1].min()
-        x2, y2 = pts[:,0].max(), pts[:,1].max()
-        # pad region
-        x = max(0, x1-pad); y = max(0, y1-pad)
-        w = min(W, x2+pad) - x;  h = min(H, y2+pad) - y
+    for (x, y, w, h), text, label in zip(boxes, texts, looks_sensitive_batch(texts, nlp, fuzzy)):
+        if label is None:
+            continue
 
-        print(f"SENSITIVE detected: '{text}' at bbox ({x},{y},{w},{h})")
-        dets.append(((x, y, w, h), text))
+        logger.log(TRACE, "SENSITIVE detected: %r at bbox (%d,%d,%d,%d)", text, x, y, w, h)
+        dets.append(((x, y, w, h), label))
 
     # 5.2 Update tracker
     tracker.update(dets)
-    print(f"Updating tracker with {len(dets)} sensitive detections...")
+    logger.debug("Updating tracker with %d sensitive detections...", len(dets))
+
+    if mode == "bbox":
+        frame_output = {}
+        for (x, y, w, h), label in tracker.active():
+            frame_output.setdefault(label, []).append([x, y, w, h])
+        return frame_output
 
     # 5.3 Redact all active tracks
-    out = frame.copy()
-    print(f"Applying {redaction_mode} redaction to active tracks...")
-    for (x,y,w,h), text in tracker.active():
-        roi = out[y:y+h, x:x+w]
-
-        if redaction_mode == "blur":
-            out[y:y+h, x:x+w] = cv2.GaussianBlur(roi, blur_ksize, 0)
-        elif redaction_mode == "pixelate":
-            out[y:y+h, x:x+w] = pixelate(roi)
-        else:  # blackout
-            out[y:y+h, x:x+w] = blackout(roi)
+    logger.debug("Applying %s redaction to active tracks...", redaction_mode)
+    out = redact_regions(
+        frame,
+        [bbox for bbox, _ in tracker.active()],
+        redaction_mode=redaction_mode,
+        blur_ksize=blur_ksize,
+        pixel_size=pixel_size,
+        out=out_buf,
+    )
 
     if debug:
       for bbox_pts, text, prob in results:
@@ -195,13 +445,136 @@ def censor_frame_consistent(
           x2, y2 = pts[:,0].max(), pts[:,1].max()
           x = max(0, x1-pad); y = max(0, y1-pad)
           w = min(W, x2+pad) - x;  h = min(H, y2+pad) - y
-          sus = looks_sensitive(text, nlp)
+          sus = looks_sensitive(text, nlp, fuzzy)
           cv2.polylines(out, [pts], isClosed=True, color=(0,0,255) if sus else (0,255,0), thickness=2)
           cv2.putText(out, text, (x1, max(15,y1-5)),
                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,255) if sus else (0,255,0), 1)
     return out
 
+def censor_frame_consistent_bbox(frame, reader, tracker, pad=8, min_prob=0.2, ocr_params=None, nlp=False):
+    """
+    Per-class dict of the active tracks' boxes for this frame, using the
+    fuzzy patterns (censor_frame_consistent with mode="bbox").
+    """
+    kwargs = {} if ocr_params is None else {"ocr_params": ocr_params}
+    return censor_frame_consistent(
+        frame, reader, tracker, pad=pad, min_prob=min_prob, nlp=nlp, mode="bbox", fuzzy=True, **kwargs
+    )
+
 # 6) Video loop
+def frame_hash(frame):
+    """
+    64-bit average hash of a BGR frame (8x8 grayscale, thresholded at its mean).
+    """
+    small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (8, 8), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(small > small.mean()).tobytes(), "big")
+
+def _ocr_batches(cap, reader, batch_size, ocr_params, out_q, skip_threshold=4, stop=None):
+    """
+    OCR stage of process_video_consistent: reads frames in batches, OCRs each
+    batch and queues (frames, results). Ends with None, or the raised exception;
+    stops early, before the next batch, once the `stop` event is set.
+
+    A frame whose hash is within `skip_threshold` bits of the last OCR'd
+    frame reuses that frame's results instead of being OCR'd (0 disables).
+    """
+    key_hash, key_results = None, None
+    try:
+        while stop is None or not stop.is_set():
+            batch = []
+            while len(batch) < batch_size:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                batch.append(frame)
+            if not batch:
+                break
+
+            # Pick the frames that need OCR; src[i] is the index into `todo` whose
+            # results frame i uses, -1 meaning the previous batch's last OCR'd frame
+            todo, src = [], []
+            for frame in batch:
+                h = frame_hash(frame)
+                if key_hash is None or (key_hash ^ h).bit_count() >= skip_threshold:
+                    key_hash = h
+                    todo.append(frame)
+                src.append(len(todo) - 1)
+
+            # Frames of one video share a shape, so they go through the OCR
+            # detector/recognizer in one call
+            ocr = reader.readtext_batched(todo, detail=1, paragraph=False, **ocr_params) if todo else []
+            out_q.put((batch, [ocr[j] if j >= 0 else key_results for j in src]))
+            if ocr:
+                key_results = ocr[-1]
+            if len(batch) < batch_size:
+                break
+    except Exception as e:
+        out_q.put(e)
+        return
+    out_q.put(None)
+
+class AvVideoWriter:
+    """
+    H.264 writer on PyAV with the cv2.VideoWriter write/release interface.
+    Encodes on the GPU with h264_nvenc when it opens, otherwise with libx264.
+    """
+    CODECS = ("h264_nvenc", "libx264")
+
+    def __init__(self, path, fps, size):
+        W, H = size
+        rate = Fraction(fps).limit_denominator(1001)
+        self.path = path
+        for codec in self.CODECS:
+            container = av.open(path, "w")
+            try:
+                stream = container.add_stream(codec, rate=rate)
+                stream.width, stream.height, stream.pix_fmt = W, H, "yuv420p"
+                # Opening here surfaces a missing GPU/driver before any frame is encoded
+                stream.codec_context.open()
+            except Exception as e:
+                logger.debug("Encoder %s unavailable: %s", codec, e)
+                try:
+                    container.close()
+                except Exception:
+                    pass
+                continue
+            self.container, self.stream, self.codec = container, stream, codec
+            return
+        raise RuntimeError(f"No H.264 encoder available (tried {', '.join(self.CODECS)})")
+
+    def write(self, frame):
+        for packet in self.stream.encode(av.VideoFrame.from_ndarray(frame, format="bgr24")):
+            self.container.mux(packet)
+
+    def release(self):
+        for packet in self.stream.encode():
+            self.container.mux(packet)
+        self.container.close()
+
+    def abort(self):
+        """Close without flushing the encoder and remove the partial file"""
+        try:
+            self.container.close()
+        except Exception:
+            pass
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def open_video_writer(path, fps, size):
+    """
+    AvVideoWriter when PyAV is installed and has an H.264 encoder, else an mp4v cv2.VideoWriter.
+    """
+    if AV_AVAILABLE:
+        try:
+            writer = AvVideoWriter(path, fps, size)
+            logger.info("Encoding with %s", writer.codec)
+            return writer
+        except Exception as e:
+            logger.warning("PyAV encoder unavailable (%s), falling back to cv2.VideoWriter", e)
+    return cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+
 def process_video_consistent(
     input_path,
     output_path="consistent_censor.mp4",
@@ -211,44 +584,84 @@ def process_video_consistent(
     redaction_mode="blackout",
     ocr_params={"text_threshold": 0.5, "low_text": 0.6, "add_margin": 0.2, "contrast_ths": 0.1, "adjust_contrast": 0.5},
     debug=False,
-    nlp=False
+    nlp=False,
+    batch_size=16,
+    skip_threshold=4
 ):
-    print(f"Starting video processing...")
-    print(f"Tracker: max_lost={max_lost}, iou_thresh={iou_thresh}")
-    print(f"Input: {input_path}")
-    print(f"Output: {output_path}")
-    print(f"Settings: pad={pad}, min_prob={min_prob}, redaction_mode={redaction_mode}")
+    logger.info("Starting video processing...")
+    logger.info("Tracker: max_lost=%d, iou_thresh=%s", max_lost, iou_thresh)
+    logger.info("Input: %s", input_path)
+    logger.info("Output: %s", output_path)
+    logger.info("Settings: pad=%d, min_prob=%s, redaction_mode=%s", pad, min_prob, redaction_mode)
 
     cap     = cv2.VideoCapture(input_path)
-    fourcc  = cv2.VideoWriter_fourcc(*"mp4v")
     fps     = cap.get(cv2.CAP_PROP_FPS) or 20.0
     W       = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     H       = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    writer  = cv2.VideoWriter(output_path, fourcc, fps, (W, H))
+    writer  = open_video_writer(output_path, fps, (W, H))
 
+    reader  = get_reader()
     tracker = PiiTracker(max_lost=max_lost, iou_thresh=iou_thresh)
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        out = censor_frame_consistent(
-            frame, reader, tracker,
-            pad=pad,
-            min_prob=min_prob,
-            redaction_mode=redaction_mode,
-            blur_ksize=(51,51),
-            ocr_params=ocr_params,
-            debug=debug,
-            nlp=nlp
-        )
-        writer.write(out)
-    
-    print(f"Video processing completed!")
-
-    cap.release()
-    writer.release()
-    print(f"Output saved to: {output_path}")
+    out_buf = np.empty((H, W, 3), dtype=np.uint8)
+
+    # OCR runs on its own thread so the GPU works on the next batch while this
+    # thread redacts and encodes the previous one
+    ocr_q = queue.Queue(maxsize=2)
+    ocr_stop = threading.Event()
+    ocr_thread = threading.Thread(
+        target=_ocr_batches, args=(cap, reader, batch_size, ocr_params, ocr_q, skip_threshold, ocr_stop), daemon=True
+    )
+    ocr_thread.start()
+
+    try:
+        while True:
+            item = ocr_q.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            batch, batch_results = item
+
+            # Tracking is frame-order dependent, so it stays on this thread
+            for frame, results in zip(batch, batch_results):
+                out = censor_frame_consistent(
+                    frame, reader, tracker,
+                    pad=pad,
+                    min_prob=min_prob,
+                    redaction_mode=redaction_mode,
+                    blur_ksize=(51,51),
+                    ocr_params=ocr_params,
+                    debug=debug,
+                    nlp=nlp,
+                    ocr_results=results,
+                    out_buf=out_buf
+                )
+                writer.write(out)
+        writer.release()
+    except BaseException:
+        # Stop the OCR thread (draining its queue so a pending put returns) and
+        # remove the half-written output
+        ocr_stop.set()
+        while ocr_thread.is_alive():
+            try:
+                ocr_q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        if hasattr(writer, "abort"):
+            writer.abort()
+        else:
+            writer.release()
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+        raise
+    finally:
+        ocr_thread.join()
+        cap.release()
+
+    logger.info("Video processing completed!")
+    logger.info("Output saved to: %s", output_path)
 
     return output_path
 
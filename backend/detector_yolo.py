@@ -5,6 +5,8 @@ import cv2
 import numpy as np
 from ultralytics import YOLOE
 
+from scripts.yolo_e import boxes_to_numpy
+
 # Optional: SAHI for slice-based inference
 try:
     from sahi.predict import get_sliced_prediction
@@ -88,25 +90,30 @@ def clamp_bbox(xyxy: Tuple[int, int, int, int], width: int, height: int) -> Tupl
 
 def extract_sensitive_boxes(result, target_names: List[str]) -> List[Tuple[int, int, int, int]]:
     boxes_xyxy: List[Tuple[int, int, int, int]] = []
-    if not hasattr(result, "boxes") or result.boxes is None:
-        return boxes_xyxy
-
     names_map = result.names if hasattr(result, "names") else {}
-    for box in result.boxes:
-        cls_idx = int(box.cls.item()) if hasattr(box, "cls") else None
-        if cls_idx is None:
-            continue
+    xyxy, _, clss = boxes_to_numpy(result)
+    for (x1, y1, x2, y2), cls_idx in zip(xyxy.astype(int).tolist(), clss.tolist()):
         cls_name = names_map.get(cls_idx, None)
         if cls_name is None or cls_name not in target_names:
             continue
-
-        xyxy = box.xyxy[0].tolist()  # [x1, y1, x2, y2]
-        x1, y1, x2, y2 = int(xyxy[0]), int(xyxy[1]), int(xyxy[2]), int(xyxy[3])
         boxes_xyxy.append((x1, y1, x2, y2))
 
     return boxes_xyxy
 
 
+def sensitive_objects(result, target_names: List[str]) -> List[Tuple[str, float]]:
+    """(class name, confidence) of each detection in `result` whose class is in `target_names`"""
+    names_map = result.names if hasattr(result, "names") else {}
+    _, confs, clss = boxes_to_numpy(result)
+    objects = []
+    for cls_idx, confidence in zip(clss.tolist(), confs.tolist()):
+        cls_name = names_map.get(cls_idx, None)
+        if cls_name is None or cls_name not in target_names:
+            continue
+        objects.append((cls_name, confidence))
+    return objects
+
+
 def apply_blur_to_regions(image: np.ndarray, boxes: List[Tuple[int, int, int, int]]) -> np.ndarray:
     if not boxes:
         return image
@@ -139,18 +146,15 @@ def apply_blur_to_masks(image: np.ndarray, result, target_names: List[str]) -> n
 
     names_map = result.names if hasattr(result, "names") else {}
     masks = result.masks.data  # [N, H, W] tensor
-    boxes = result.boxes
+    _, _, clss = boxes_to_numpy(result)
 
     h, w = image.shape[:2]
     fully_blurred = cv2.GaussianBlur(image, ksize=BLUR_KERNEL, sigmaX=BLUR_SIGMA_X)
     output = image.copy()
 
-    num_instances = masks.shape[0]
+    num_instances = min(masks.shape[0], len(clss))
     for i in range(num_instances):
-        cls_idx = int(boxes.cls[i].item()) if hasattr(boxes, "cls") else None
-        if cls_idx is None:
-            continue
-        cls_name = names_map.get(cls_idx, None)
+        cls_name = names_map.get(int(clss[i]), None)
         if cls_name is None or cls_name not in target_names:
             continue
 
@@ -241,13 +245,10 @@ def process_image(input_path: str, output_path: str) -> str:
                     fully_blurred_roi = cv2.GaussianBlur(roi, ksize=BLUR_KERNEL, sigmaX=BLUR_SIGMA_X)
                     names_map = roi_result.names if hasattr(roi_result, "names") else {}
                     masks = roi_result.masks.data
-                    boxes_roi = roi_result.boxes
-                    num_instances = masks.shape[0]
+                    _, _, roi_cls = boxes_to_numpy(roi_result)
+                    num_instances = min(masks.shape[0], len(roi_cls))
                     for i in range(num_instances):
-                        cls_idx = int(boxes_roi.cls[i].item()) if hasattr(boxes_roi, "cls") else None
-                        if cls_idx is None:
-                            continue
-                        cls_name = names_map.get(cls_idx, None)
+                        cls_name = names_map.get(int(roi_cls[i]), None)
                         if cls_name is None or cls_name not in SENSITIVE_CLASSES:
                             continue
                         mask = masks[i].detach().cpu().numpy()
@@ -272,36 +273,13 @@ def process_image(input_path: str, output_path: str) -> str:
         results = model.predict(work_img, device=DEVICE, conf=CONF_THRESHOLD, imgsz=IMG_SIZE, iou=IOU_THRESHOLD, augment=TTA)
         result = results[0]
         boxes = []
-        detected_objects = []
         if hasattr(result, "masks") and result.masks is not None and hasattr(result.masks, "data"):
             processed = apply_blur_to_masks(work_img, result, SENSITIVE_CLASSES)
-            # Extract object info from masks
-            if hasattr(result, "boxes") and result.boxes is not None:
-                names_map = result.names if hasattr(result, "names") else {}
-                for i, box in enumerate(result.boxes):
-                    cls_idx = int(box.cls.item()) if hasattr(box, "cls") else None
-                    if cls_idx is None:
-                        continue
-                    cls_name = names_map.get(cls_idx, None)
-                    if cls_name is None or cls_name not in SENSITIVE_CLASSES:
-                        continue
-                    confidence = float(box.conf.item()) if hasattr(box, "conf") else 0.0
-                    detected_objects.append((cls_name, confidence))
+            detected_objects = sensitive_objects(result, SENSITIVE_CLASSES)
         else:
             boxes = extract_sensitive_boxes(result, SENSITIVE_CLASSES)
             processed = apply_blur_to_regions(work_img, boxes)
-            # Extract object info from boxes
-            if hasattr(result, "boxes") and result.boxes is not None:
-                names_map = result.names if hasattr(result, "names") else {}
-                for box in result.boxes:
-                    cls_idx = int(box.cls.item()) if hasattr(box, "cls") else None
-                    if cls_idx is None:
-                        continue
-                    cls_name = names_map.get(cls_idx, None)
-                    if cls_name is None or cls_name not in SENSITIVE_CLASSES:
-                        continue
-                    confidence = float(box.conf.item()) if hasattr(box, "conf") else 0.0
-                    detected_objects.append((cls_name, confidence))
+            detected_objects = sensitive_objects(result, SENSITIVE_CLASSES)
 
         print(f"Found {len(detected_objects)} sensitive objects:")
         for obj_name, conf in detected_objects:
@@ -453,13 +431,10 @@ def process_video(input_path: str, output_path: str) -> str:
                             fully_blurred_roi = cv2.GaussianBlur(roi, ksize=BLUR_KERNEL, sigmaX=BLUR_SIGMA_X)
                             names_map = roi_result.names if hasattr(roi_result, "names") else {}
                             masks = roi_result.masks.data
-                            boxes_roi = roi_result.boxes
-                            num_instances = masks.shape[0]
+                            _, _, roi_cls = boxes_to_numpy(roi_result)
+                            num_instances = min(masks.shape[0], len(roi_cls))
                             for i in range(num_instances):
-                                cls_idx = int(boxes_roi.cls[i].item()) if hasattr(boxes_roi, "cls") else None
-                                if cls_idx is None:
-                                    continue
-                                cls_name = names_map.get(cls_idx, None)
+                                cls_name = names_map.get(int(roi_cls[i]), None)
                                 if cls_name is None or cls_name not in SENSITIVE_CLASSES:
                                     continue
                                 mask = masks[i].detach().cpu().numpy()
@@ -487,36 +462,13 @@ def process_video(input_path: str, output_path: str) -> str:
                 )
                 result = results[0]
                 boxes = []  # Initialize boxes variable
-                detected_objects = []
                 if hasattr(result, "masks") and result.masks is not None and hasattr(result.masks, "data"):
                     processed = apply_blur_to_masks(work_frame, result, SENSITIVE_CLASSES)
-                    # Extract object info from masks
-                    if hasattr(result, "boxes") and result.boxes is not None:
-                        names_map = result.names if hasattr(result, "names") else {}
-                        for i, box in enumerate(result.boxes):
-                            cls_idx = int(box.cls.item()) if hasattr(box, "cls") else None
-                            if cls_idx is None:
-                                continue
-                            cls_name = names_map.get(cls_idx, None)
-                            if cls_name is None or cls_name not in SENSITIVE_CLASSES:
-                                continue
-                            confidence = float(box.conf.item()) if hasattr(box, "conf") else 0.0
-                            detected_objects.append((cls_name, confidence))
+                    detected_objects = sensitive_objects(result, SENSITIVE_CLASSES)
                 else:
                     boxes = extract_sensitive_boxes(result, SENSITIVE_CLASSES)
                     processed = apply_blur_to_regions(work_frame, boxes)
-                    # Extract object info from boxes
-                    if hasattr(result, "boxes") and result.boxes is not None:
-                        names_map = result.names if hasattr(result, "names") else {}
-                        for box in result.boxes:
-                            cls_idx = int(box.cls.item()) if hasattr(box, "cls") else None
-                            if cls_idx is None:
-                                continue
-                            cls_name = names_map.get(cls_idx, None)
-                            if cls_name is None or cls_name not in SENSITIVE_CLASSES:
-                                continue
-                            confidence = float(box.conf.item()) if hasattr(box, "conf") else 0.0
-                            detected_objects.append((cls_name, confidence))
+                    detected_objects = sensitive_objects(result, SENSITIVE_CLASSES)
                 print(f"Frame {frame_count:4d}/{total_frames}: Found {len(detected_objects)} sensitive objects")
                 for obj_name, conf in detected_objects:
                     print(f"  - {obj_name}: {conf:.3f}")
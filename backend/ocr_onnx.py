@@ -0,0 +1,109 @@
+"""
+ONNX Runtime backend for the EasyOCR reader.
+
+EasyOCR's CRAFT detector and CRNN recognizer are exported to ONNX once and
+then run through onnxruntime (TensorRT EP with fp16 and an engine cache, else
+CUDA, else CPU). The sessions are swapped in for the reader's PyTorch modules,
+so EasyOCR's own pre/post-processing is kept and `readtext` /
+`readtext_batched` still return the same (bbox, text, prob) results.
+
+Export:  python ocr_onnx.py <model_dir>
+Use:     PII_OCR_ONNX_DIR=<model_dir>  (picked up by ocr_singleton.get_reader)
+"""
+import os
+import sys
+import logging
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+DETECTOR_FILE = "craft_detector.onnx"
+RECOGNIZER_FILE = "crnn_recognizer.onnx"
+
+def _providers(model_dir):
+    import onnxruntime as ort
+
+    available = ort.get_available_providers()
+    providers = []
+    if "TensorrtExecutionProvider" in available:
+        providers.append(("TensorrtExecutionProvider", {
+            "trt_fp16_enable": True,
+            "trt_engine_cache_enable": True,
+            "trt_engine_cache_path": os.path.join(model_dir, "trt_cache"),
+        }))
+    if "CUDAExecutionProvider" in available:
+        providers.append("CUDAExecutionProvider")
+    providers.append("CPUExecutionProvider")
+    return providers
+
+class OnnxModule:
+    """
+    Callable stand-in for a torch module backed by an onnxruntime session.
+    Positional tensor inputs map onto the session's inputs in order (inputs
+    pruned at export, like the recognizer's unused `text`, are dropped) and
+    outputs come back as CPU tensors.
+    """
+    def __init__(self, path, providers):
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(path, providers=providers)
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def __call__(self, *inputs):
+        feed = {
+            name: t.detach().cpu().numpy() if isinstance(t, torch.Tensor) else np.asarray(t)
+            for name, t in zip(self.input_names, inputs)
+        }
+        outputs = [torch.from_numpy(o) for o in self.session.run(None, feed)]
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+def export_onnx(reader, model_dir):
+    """One-time export of `reader`'s detector and recognizer to `model_dir`"""
+    os.makedirs(model_dir, exist_ok=True)
+    device = next(reader.detector.parameters()).device
+
+    # DataParallel wrappers (GPU readers) are not exportable, the inner modules are
+    detector = getattr(reader.detector, "module", reader.detector).eval()
+    recognizer = getattr(reader.recognizer, "module", reader.recognizer).eval()
+
+    with torch.no_grad():
+        torch.onnx.export(
+            detector,
+            (torch.zeros(1, 3, 640, 640, device=device),),
+            os.path.join(model_dir, DETECTOR_FILE),
+            input_names=["image"],
+            output_names=["score", "feature"],
+            dynamic_axes={"image": {0: "batch", 2: "height", 3: "width"},
+                          "score": {0: "batch", 1: "height", 2: "width"},
+                          "feature": {0: "batch", 2: "height", 3: "width"}},
+            opset_version=17,
+        )
+        torch.onnx.export(
+            recognizer,
+            (torch.zeros(1, 1, 64, 256, device=device), torch.zeros(1, 1, dtype=torch.long, device=device)),
+            os.path.join(model_dir, RECOGNIZER_FILE),
+            input_names=["image", "text"],
+            output_names=["preds"],
+            dynamic_axes={"image": {0: "batch", 3: "width"},
+                          "preds": {0: "batch", 1: "steps"}},
+            opset_version=17,
+        )
+    logger.info("Exported EasyOCR models to %s", model_dir)
+
+def use_onnx(reader, model_dir):
+    """Swap `reader`'s PyTorch detector/recognizer for onnxruntime sessions from `model_dir`"""
+    providers = _providers(model_dir)
+    reader.detector = OnnxModule(os.path.join(model_dir, DETECTOR_FILE), providers)
+    reader.recognizer = OnnxModule(os.path.join(model_dir, RECOGNIZER_FILE), providers)
+    logger.info("EasyOCR running on onnxruntime (%s)", reader.detector.session.get_providers()[0])
+    return reader
+
+if __name__ == "__main__":
+    import easyocr
+
+    export_onnx(easyocr.Reader(["en"], gpu=torch.cuda.is_available()), sys.argv[1] if len(sys.argv) > 1 else "onnx_models")
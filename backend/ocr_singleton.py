@@ -0,0 +1,76 @@
+"""
+Lazily loaded OCR and NLP models shared by the detector modules
+"""
+import functools
+import os
+
+# Token-classification model used by looks_sensitive(nlp=True)
+NLP_MODEL_NAME = os.getenv("PII_NLP_MODEL", "iiiorg/piiranha-v1-detect-personal-information")
+# "cpu" keeps the NLP model off the GPU, leaving it to OCR; unset picks cuda when available
+NLP_DEVICE = os.getenv("PII_NLP_DEVICE")
+# int8 dynamic quantization on CPU / fp16 on GPU; only the argmax label is used
+NLP_QUANTIZE = os.getenv("PII_NLP_QUANTIZE", "1") != "0"
+# Directory of models exported by ocr_onnx.py; when set, OCR runs on onnxruntime
+OCR_ONNX_DIR = os.getenv("PII_OCR_ONNX_DIR")
+
+@functools.lru_cache(maxsize=1)
+def get_reader():
+    """Get the EasyOCR reader, loading it on first use"""
+    import easyocr
+
+    print("Loading EasyOCR model...")
+    reader = easyocr.Reader(["en"], gpu=True)
+    if OCR_ONNX_DIR:
+        from ocr_onnx import use_onnx
+        reader = use_onnx(reader, OCR_ONNX_DIR)
+    print("EasyOCR model loaded successfully")
+    return reader
+
+@functools.lru_cache(maxsize=1)
+def get_nlp():
+    """Get (tokenizer, model, device) for the PII NLP model, loading it on first use"""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForTokenClassification
+
+    device = torch.device(NLP_DEVICE or ("cuda" if torch.cuda.is_available() else "cpu"))
+    tokenizer = AutoTokenizer.from_pretrained(NLP_MODEL_NAME)
+    model = AutoModelForTokenClassification.from_pretrained(NLP_MODEL_NAME)
+    model.eval()
+    if NLP_QUANTIZE:
+        if device.type == "cpu":
+            from torch.ao.quantization import quantize_dynamic
+            model = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        else:
+            model = model.half()
+    model = model.to(device)
+    return tokenizer, model, device
+
+@functools.lru_cache(maxsize=1)
+def get_sensitive_ids():
+    """Get the NLP model's non-'O' label ids as a tensor on the model's device"""
+    import torch
+
+    _, model, device = get_nlp()
+    return torch.tensor([i for i, label in model.config.id2label.items() if label != "O"], device=device)
+
+def classify_pii(texts):
+    """
+    First sensitive NLP label of each text (None if it has none), from one
+    batched forward pass and a single device-to-host copy.
+    """
+    import torch
+
+    if not texts:
+        return []
+    tokenizer, model, device = get_nlp()
+    inputs = tokenizer(list(texts), return_tensors="pt", truncation=True, padding=True).to(device)
+    with torch.no_grad():
+        preds = torch.argmax(model(**inputs).logits, dim=-1)
+
+    # Padding positions never count as hits; argmax of the bool mask is the first hit
+    hits = torch.isin(preds, get_sensitive_ids()) & inputs["attention_mask"].bool()
+    first = preds.gather(1, hits.float().argmax(dim=1, keepdim=True))[:, 0]
+    label_ids = torch.where(hits.any(dim=1), first, torch.full_like(first, -1)).tolist()
+
+    id2label = model.config.id2label
+    return [id2label[i] if i >= 0 else None for i in label_ids]
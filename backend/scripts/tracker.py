@@ -2,22 +2,31 @@ from dataclasses import dataclass
 from typing import List, Dict, Any, Tuple, Optional
 import numpy as np
 
+# Optional: SciPy for optimal (Hungarian) assignment; greedy matching without it
+try:
+    from scipy.optimize import linear_sum_assignment
+except Exception:
+    linear_sum_assignment = None
+
+# Optional: Numba JIT for the geometry kernels (plain Python / NumPy without it)
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except Exception:
+    NUMBA_AVAILABLE = False
+    prange = range
+    def njit(*args, **kwargs):
+        return lambda f: f
+
 # ------------------------------- Geometry -------------------------------- #
 
-def iou_xyxy(a: np.ndarray, b: np.ndarray) -> float:
+@njit(cache=True, fastmath=True)
+def _iou_xyxy_nb(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
     """
-    IoU between two boxes [x1,y1,x2,y2].
+    Scalar IoU kernel behind iou_xyxy.
     """
-    ax1, ay1, ax2, ay2 = a
-    bx1, by1, bx2, by2 = b
-
-    inter_x1 = max(ax1, bx1)
-    inter_y1 = max(ay1, by1)
-    inter_x2 = min(ax2, bx2)
-    inter_y2 = min(ay2, by2)
-
-    iw = max(0.0, inter_x2 - inter_x1)
-    ih = max(0.0, inter_y2 - inter_y1)
+    iw = max(0.0, min(ax2, bx2) - max(ax1, bx1))
+    ih = max(0.0, min(ay2, by2) - max(ay1, by1))
     inter = iw * ih
     if inter <= 0.0:
         return 0.0
@@ -27,33 +36,94 @@ def iou_xyxy(a: np.ndarray, b: np.ndarray) -> float:
     union = area_a + area_b - inter
     if union <= 0.0:
         return 0.0
-    return float(inter / union)
+    return inter / union
 
 
-def inflate_and_clip(box: np.ndarray, scale_up: float, pad_px: int,
-                     frame_w: int, frame_h: int) -> np.ndarray:
+def iou_xyxy(a: np.ndarray, b: np.ndarray) -> float:
     """
-    Inflate `box` by scale_up around its center, then add pad_px, then clip to frame.
+    IoU between two boxes [x1,y1,x2,y2].
+    """
+    ax1, ay1, ax2, ay2 = a
+    bx1, by1, bx2, by2 = b
+    return float(_iou_xyxy_nb(float(ax1), float(ay1), float(ax2), float(ay2),
+                              float(bx1), float(by1), float(bx2), float(by2)))
+
+
+def box_areas(boxes: np.ndarray) -> np.ndarray:
+    """
+    Areas of an (N,4) array of boxes [x1,y1,x2,y2] (0 for inverted boxes).
+    """
+    return np.clip(boxes[..., 2] - boxes[..., 0], 0.0, None) * np.clip(boxes[..., 3] - boxes[..., 1], 0.0, None)
+
+
+def iou_matrix_xyxy(a: np.ndarray, b: np.ndarray, area_a: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Pairwise IoU between (N,4) and (M,4) arrays of boxes [x1,y1,x2,y2] -> (N,M).
+    `area_a` may pass in box_areas(a) when the caller already has it.
+    """
+    iw = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0.0, None)
+    ih = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0.0, None)
+    inter = iw * ih
+
+    if area_a is None:
+        area_a = box_areas(a)
+    area_b = box_areas(b)
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0.0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+@njit(parallel=True, cache=True)
+def _iou_matrix_cls_nb(a, area_a, cls_a, b, area_b, cls_b, out):
+    """
+    Parallel (over rows of `a`) kernel behind iou_matrix_cls: IoU into `out`
+    (N,M), -1 for pairs of different classes.
+    """
+    for i in prange(a.shape[0]):
+        for j in range(b.shape[0]):
+            if cls_a[i] != cls_b[j]:
+                out[i, j] = -1.0
+                continue
+            iw = max(0.0, min(a[i, 2], b[j, 2]) - max(a[i, 0], b[j, 0]))
+            ih = max(0.0, min(a[i, 3], b[j, 3]) - max(a[i, 1], b[j, 1]))
+            inter = iw * ih
+            union = area_a[i] + area_b[j] - inter
+            out[i, j] = inter / max(union, 1e-9) if union > 0.0 else 0.0
+
+
+def iou_matrix_cls(a: np.ndarray, cls_a: np.ndarray, b: np.ndarray, cls_b: np.ndarray,
+                   area_a: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    iou_matrix_xyxy restricted to same-class pairs: pairs whose classes differ
+    get -1, so they never pass an IoU threshold. Runs as a parallel Numba
+    kernel when available.
+    """
+    if area_a is None:
+        area_a = box_areas(a)
+    if not NUMBA_AVAILABLE:
+        iou = iou_matrix_xyxy(a, b, area_a=area_a)
+        return np.where(cls_a[:, None] == cls_b[None, :], iou, -1.0)
+    out = np.empty((len(a), len(b)), dtype=np.float64)
+    _iou_matrix_cls_nb(np.ascontiguousarray(a, dtype=np.float32), np.ascontiguousarray(area_a, dtype=np.float32),
+                       np.ascontiguousarray(cls_a, dtype=np.int32), np.ascontiguousarray(b, dtype=np.float32),
+                       box_areas(b).astype(np.float32), np.ascontiguousarray(cls_b, dtype=np.int32), out)
+    return out
+
+
+@njit(cache=True, fastmath=True)
+def _inflate_and_clip_nb(x1, y1, x2, y2, scale_up, pad_px, frame_w, frame_h):
+    """
+    Scalar kernel behind inflate_and_clip; returns (0,0,0,0) for an empty result.
     """
-    x1, y1, x2, y2 = box
-    w = x2 - x1
-    h = y2 - y1
     cx = (x1 + x2) * 0.5
     cy = (y1 + y2) * 0.5
 
-    # scale around center
-    w2 = w * scale_up
-    h2 = h * scale_up
-    x1s = cx - w2 / 2.0
-    y1s = cy - h2 / 2.0
-    x2s = cx + w2 / 2.0
-    y2s = cy + h2 / 2.0
-
-    # add pixel padding
-    x1s -= pad_px
-    y1s -= pad_px
-    x2s += pad_px
-    y2s += pad_px
+    # scale around center, then add pixel padding
+    hw = (x2 - x1) * scale_up / 2.0
+    hh = (y2 - y1) * scale_up / 2.0
+    x1s = cx - hw - pad_px
+    y1s = cy - hh - pad_px
+    x2s = cx + hw + pad_px
+    y2s = cy + hh + pad_px
 
     # clip
     x1s = max(0.0, x1s)
@@ -63,9 +133,23 @@ def inflate_and_clip(box: np.ndarray, scale_up: float, pad_px: int,
 
     # ensure valid
     if x2s <= x1s or y2s <= y1s:
-        return np.array([0.0, 0.0, 0.0, 0.0], dtype=np.float32)
+        return 0.0, 0.0, 0.0, 0.0
+    return x1s, y1s, x2s, y2s
 
-    return np.array([x1s, y1s, x2s, y2s], dtype=np.float32)
+
+def inflate_and_clip(box: np.ndarray, scale_up: float, pad_px: int,
+                     frame_w: int, frame_h: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Inflate `box` by scale_up around its center, then add pad_px, then clip to frame.
+    Written into `out` (a float32 (4,) buffer, may be `box` itself) when given.
+    """
+    x1, y1, x2, y2 = box
+    res = _inflate_and_clip_nb(float(x1), float(y1), float(x2), float(y2),
+                               float(scale_up), float(pad_px), frame_w, frame_h)
+    if out is None:
+        return np.array(res, dtype=np.float32)
+    out[:] = res
+    return out
 
 
 # ------------------------------- Tracking -------------------------------- #
@@ -73,7 +157,8 @@ def inflate_and_clip(box: np.ndarray, scale_up: float, pad_px: int,
 @dataclass
 class Track:
     track_id: int
-    cls_name: str
+    cls_id: int               # class index; used for matching
+    cls_name: str             # class name; output only
     smooth_bbox: np.ndarray   # [x1,y1,x2,y2], smoothed
     last_bbox: np.ndarray     # latest raw detection box
     conf_avg: float
@@ -85,18 +170,28 @@ class Track:
 class BoxTracker:
     """
     Lightweight detection-to-track associator with EMA smoothing.
-    - Greedy IoU matching (no external deps)
+    - IoU matching: optimal assignment with SciPy, greedy without it
     - EMA smoothing to reduce jitter
     - max_age to keep censoring when detection drops briefly
+    - constant-velocity extrapolation for frames without detection
+      (step_no_detections)
+
+    Track state is stored as parallel arrays (one slot per track, grown on
+    demand, freed slots reused); `Track` objects are only built for output.
     """
 
+    # per-slot state arrays, in the order _alloc creates them
+    _FIELDS = ("_ids", "_cls", "_last", "_areas", "_smooth", "_vel", "_since",
+               "_conf", "_hits", "_misses", "_init", "_alive")
+
     def __init__(self,
                  alpha: float = 0.5,          # EMA smoothing factor
                  iou_match_thresh: float = 0.4,
                  max_age: int = 5,            # keep track alive if missing up to this many frames
                  n_init: int = 0,             # 0 => render immediately once matched
                  scale_up: float = 1.15,      # inflate censor box by 15%
-                 pad_px: int = 0):
+                 pad_px: int = 0,
+                 capacity: int = 64):         # initial number of track slots
         self.alpha = float(alpha)
         self.iou_match_thresh = float(iou_match_thresh)
         self.max_age = int(max_age)
@@ -104,133 +199,215 @@ class BoxTracker:
         self.scale_up = float(scale_up)
         self.pad_px = int(pad_px)
 
-        self.tracks: Dict[int, Track] = {}
+        self._alloc(max(1, int(capacity)))
         self.next_id: int = 1
 
+    def _alloc(self, cap: int):
+        self._ids = np.zeros(cap, dtype=np.int64)
+        self._cls = np.zeros(cap, dtype=np.int32)
+        self._last = np.zeros((cap, 4), dtype=np.float32)     # latest raw detection boxes
+        self._areas = np.zeros(cap, dtype=np.float32)         # box_areas(_last), kept in sync with it
+        self._smooth = np.zeros((cap, 4), dtype=np.float32)   # smoothed boxes
+        self._vel = np.zeros((cap, 4), dtype=np.float32)      # per-frame box velocity, from matched detections
+        self._since = np.zeros(cap, dtype=np.int64)           # frames since the last matched detection
+        self._conf = np.zeros(cap, dtype=np.float64)
+        self._hits = np.zeros(cap, dtype=np.int64)
+        self._misses = np.zeros(cap, dtype=np.int64)
+        self._init = np.zeros(cap, dtype=bool)
+        self._alive = np.zeros(cap, dtype=bool)
+        self._names: List[str] = [""] * cap
+        self._free: List[int] = list(range(cap - 1, -1, -1))  # stack of free slots, lowest on top
+
+    def _grow(self):
+        cap = len(self._ids)
+        for name in self._FIELDS:
+            old = getattr(self, name)
+            arr = np.zeros((2 * cap,) + old.shape[1:], dtype=old.dtype)
+            arr[:cap] = old
+            setattr(self, name, arr)
+        self._names.extend([""] * cap)
+        self._free[:0] = range(2 * cap - 1, cap - 1, -1)
+
     def reset(self):
-        self.tracks.clear()
+        self._alive[:] = False
+        self._free = list(range(len(self._ids) - 1, -1, -1))
         self.next_id = 1
 
-    @staticmethod
-    def _ema(prev: np.ndarray, cur: np.ndarray, alpha: float) -> np.ndarray:
-        if prev is None:
-            return cur.copy()
-        return alpha * cur + (1.0 - alpha) * prev
-
-    def _greedy_match(self,
-                      det_boxes: List[np.ndarray],
-                      det_names: List[str],
-                      frame_wh: Tuple[int, int]) -> Tuple[List[Tuple[int, int]], List[int], List[int]]:
+    def _slots(self) -> np.ndarray:
+        """Live slots, in track creation (track_id) order"""
+        slots = np.flatnonzero(self._alive)
+        return slots[np.argsort(self._ids[slots], kind="stable")]
+
+    def _track(self, s: int) -> Track:
+        return Track(
+            track_id=int(self._ids[s]),
+            cls_id=int(self._cls[s]),
+            cls_name=self._names[s],
+            smooth_bbox=self._smooth[s].copy(),
+            last_bbox=self._last[s].copy(),
+            conf_avg=float(self._conf[s]),
+            hits=int(self._hits[s]),
+            misses=int(self._misses[s]),
+            initialized=bool(self._init[s]),
+        )
+
+    @property
+    def tracks(self) -> Dict[int, Track]:
+        """Snapshot of the live tracks by track_id"""
+        return {int(self._ids[s]): self._track(s) for s in self._slots().tolist()}
+
+    def _match(self,
+               slots: np.ndarray,
+               det_boxes: np.ndarray,
+               det_cls: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
         """
-        Greedy IoU matching per class:
-        Returns (matches, unmatched_track_ids, unmatched_det_idxs)
-        where matches is list of (track_id, det_index).
+        IoU matching per class, maximizing total IoU over same-class pairs with
+        IoU >= thresh (Hungarian via SciPy; best-IoU-first greedy without it).
+        Returns (ti, dj, matched_t, matched_d): matched pairs as positions into
+        `slots` / detection indices, and the matched flags of both sides.
         """
-        # build candidate pairs (same class, IoU >= thresh)
-        pairs = []  # (IoU, track_id, det_idx)
-        for tid, tr in self.tracks.items():
-            for j, (db, cname) in enumerate(zip(det_boxes, det_names)):
-                if tr.cls_name != cname:
-                    continue
-                iou = iou_xyxy(tr.last_bbox, db)
-                if iou >= self.iou_match_thresh:
-                    pairs.append((iou, tid, j))
-
-        # sort by best IoU first
-        pairs.sort(reverse=True, key=lambda x: x[0])
-
-        matched_tracks = set()
-        matched_dets = set()
-        matches: List[Tuple[int, int]] = []
-        for iou, tid, j in pairs:
-            if tid in matched_tracks or j in matched_dets:
-                continue
-            matched_tracks.add(tid)
-            matched_dets.add(j)
-            matches.append((tid, j))
-
-        # compute unmatched sets
-        unmatched_track_ids = [tid for tid in self.tracks.keys() if tid not in matched_tracks]
-        unmatched_det_idxs = [j for j in range(len(det_boxes)) if j not in matched_dets]
-        return matches, unmatched_track_ids, unmatched_det_idxs
+        matched_t = np.zeros(len(slots), dtype=bool)
+        matched_d = np.zeros(len(det_boxes), dtype=bool)
+        ti = dj = np.zeros(0, dtype=np.intp)
+        if len(slots) and len(det_boxes):
+            # (T,D) IoU of every track/detection pair, -1 across classes
+            iou = iou_matrix_cls(self._last[slots], self._cls[slots], det_boxes, det_cls,
+                                 area_a=self._areas[slots])
+
+            # candidate pairs: same class and IoU >= thresh
+            cand = (iou >= self.iou_match_thresh) & (iou >= 0.0)
+
+            if linear_sum_assignment is not None:
+                # non-candidates weigh 0 and are dropped from the assignment afterwards;
+                # the assignment is one-to-one already
+                rows, cols = linear_sum_assignment(np.where(cand, iou, 0.0), maximize=True)
+                ok = cand[rows, cols]
+                ti, dj = rows[ok], cols[ok]
+                matched_t[ti] = True
+                matched_d[dj] = True
+            else:
+                # best IoU first; the stable sort keeps track-then-detection order on ties
+                ci, cj = np.nonzero(cand)
+                order = np.argsort(-iou[ci, cj], kind="stable")
+                pairs = []
+                for i, j in zip(ci[order].tolist(), cj[order].tolist()):
+                    if matched_t[i] or matched_d[j]:
+                        continue
+                    matched_t[i] = True
+                    matched_d[j] = True
+                    pairs.append((i, j))
+                if pairs:
+                    ti, dj = np.array(pairs, dtype=np.intp).T
+
+        return ti, dj, matched_t, matched_d
 
     def step(self,
-             detections: List[Dict[str, Any]],
-             frame_size: Tuple[int, int]) -> List[Track]:
+             det_boxes: np.ndarray,
+             det_confs: np.ndarray,
+             det_cls: np.ndarray,
+             frame_size: Tuple[int, int],
+             names: Optional[Dict[int, str]] = None) -> List[Track]:
         """
         Update tracker with current frame detections and return ACTIVE tracks
         for censoring this frame.
-        `detections` expects dicts with keys: "xyxy": list[4], "conf": float, "name": str
+        Detections are parallel arrays: boxes (N,4) [x1,y1,x2,y2], confidences
+        (N,) and class ids (N,); `names` maps class ids to the names reported
+        on new tracks (the id as a string when missing).
         """
         W, H = frame_size
-        # 1) Prepare det arrays
-        det_boxes: List[np.ndarray] = []
-        det_names: List[str] = []
-        det_confs: List[float] = []
-        for d in detections:
-            b = np.array(d["xyxy"], dtype=np.float32)
-            # enforce valid box
-            if b[2] <= b[0] or b[3] <= b[1]:
-                continue
-            det_boxes.append(b)
-            det_names.append(str(d["name"]))
-            det_confs.append(float(d["conf"]))
+        # 1) Prepare det arrays, invalid boxes dropped
+        det_boxes = np.asarray(det_boxes, dtype=np.float32).reshape(-1, 4)
+        valid = (det_boxes[:, 2] > det_boxes[:, 0]) & (det_boxes[:, 3] > det_boxes[:, 1])
+        det_boxes = det_boxes[valid]
+        det_confs = np.asarray(det_confs, dtype=np.float64).reshape(-1)[valid]
+        det_cls = np.asarray(det_cls, dtype=np.int32).reshape(-1)[valid]
+        names = names or {}
 
         # 2) Match to existing tracks
-        matches, unmatched_track_ids, unmatched_det_idxs = self._greedy_match(det_boxes, det_names, (W, H))
-
-        # 3) Update matched tracks
-        for tid, j in matches:
-            tr = self.tracks[tid]
-            det_box = det_boxes[j]
-            det_conf = det_confs[j]
-            tr.last_bbox = det_box
-            tr.smooth_bbox = self._ema(tr.smooth_bbox, det_box, self.alpha)
-            tr.conf_avg = 0.7 * tr.conf_avg + 0.3 * det_conf if tr.hits > 0 else det_conf
-            tr.hits += 1
-            tr.misses = 0
-            if tr.hits >= self.n_init:
-                tr.initialized = True
-
-        # 4) Age unmatched tracks
-        to_delete = []
-        for tid in unmatched_track_ids:
-            tr = self.tracks[tid]
-            tr.misses += 1
-            # keep smooth box as-is during misses (temporal persistence)
-            if tr.misses > self.max_age:
-                to_delete.append(tid)
-        for tid in to_delete:
-            self.tracks.pop(tid, None)
+        slots = self._slots()
+        self._since[slots] += 1
+        ti, dj, matched_t, matched_d = self._match(slots, det_boxes, det_cls)
+
+        # 3) Update matched tracks: EMA of boxes and confidences, all matches at once
+        if len(ti):
+            ms = slots[ti]
+            cur = det_boxes[dj]
+            self._vel[ms] = (cur - self._last[ms]) / self._since[ms][:, None]
+            self._since[ms] = 0
+            self._last[ms] = cur
+            self._areas[ms] = box_areas(cur)
+            smooth = self._smooth[ms]
+            smooth *= (1.0 - self.alpha)
+            smooth += self.alpha * cur
+            self._smooth[ms] = smooth
+            cur_conf = det_confs[dj]
+            self._conf[ms] = np.where(self._hits[ms] > 0, 0.7 * self._conf[ms] + 0.3 * cur_conf, cur_conf)
+            self._hits[ms] += 1
+            self._misses[ms] = 0
+            self._init[ms] |= self._hits[ms] >= self.n_init
+
+        # 4) Age unmatched tracks; smooth boxes are kept as-is during misses (temporal persistence)
+        us = slots[~matched_t]
+        self._misses[us] += 1
+        dead = us[self._misses[us] > self.max_age]
+        self._alive[dead] = False
+        self._free.extend(dead.tolist())
 
         # 5) Create new tracks for unmatched detections
-        for j in unmatched_det_idxs:
-            det_box = det_boxes[j]
-            cname = det_names[j]
-            det_conf = det_confs[j]
-            tid = self.next_id
+        for j in np.flatnonzero(~matched_d).tolist():
+            if not self._free:
+                self._grow()
+            s = self._free.pop()
+            self._ids[s] = self.next_id
             self.next_id += 1
-            self.tracks[tid] = Track(
-                track_id=tid,
-                cls_name=cname,
-                smooth_bbox=det_box.copy(),   # initialize smoothed at first box
-                last_bbox=det_box.copy(),
-                conf_avg=det_conf,
-                hits=1,
-                misses=0,
-                initialized=(self.n_init <= 1),
-            )
+            cls_id = int(det_cls[j])
+            self._cls[s] = cls_id
+            self._names[s] = str(names.get(cls_id, cls_id))
+            self._last[s] = det_boxes[j]
+            self._areas[s] = box_areas(det_boxes[j])
+            self._smooth[s] = det_boxes[j]   # initialize smoothed at first box
+            self._vel[s] = 0.0
+            self._since[s] = 0
+            self._conf[s] = det_confs[j]
+            self._hits[s] = 1
+            self._misses[s] = 0
+            self._init[s] = self.n_init <= 1
+            self._alive[s] = True
 
         # 6) Collect active tracks for rendering this frame
         active: List[Track] = []
-        for tr in self.tracks.values():
-            if tr.initialized and tr.misses <= self.max_age:
-                # ensure box is valid and within frame after inflate/pad
-                inf_box = inflate_and_clip(tr.smooth_bbox, self.scale_up, self.pad_px, W, H)
-                if inf_box[2] > inf_box[0] and inf_box[3] > inf_box[1]:
-                    # update smooth box to clipped inflated version for rendering
-                    # (keeps final region stable in subsequent frames too)
-                    tr.smooth_bbox = inf_box
-                    active.append(tr)
-
-        return active
\ No newline at end of file
+        slots = self._slots()
+        for s in slots[self._init[slots] & (self._misses[slots] <= self.max_age)].tolist():
+            # ensure box is valid and within frame after inflate/pad
+            x1, y1, x2, y2 = _inflate_and_clip_nb(*self._smooth[s].tolist(), self.scale_up, float(self.pad_px), W, H)
+            if x2 > x1 and y2 > y1:
+                # update smooth box to clipped inflated version for rendering
+                # (keeps final region stable in subsequent frames too)
+                self._smooth[s] = (x1, y1, x2, y2)
+                active.append(self._track(s))
+
+        return active
+
+    def step_no_detections(self, frame_size: Tuple[int, int]) -> List[Track]:
+        """
+        Advance the tracker by a frame that got no detection pass and return
+        the ACTIVE tracks for censoring it. Tracks matched on the last
+        detection frame move by their velocity; others stay where they are.
+        Misses are not counted: an undetected frame is not a failed match.
+        """
+        W, H = frame_size
+        slots = self._slots()
+        self._since[slots] += 1
+        moving = slots[self._misses[slots] == 0]
+        self._smooth[moving] += self._vel[moving]
+
+        active: List[Track] = []
+        for s in slots[self._init[slots]].tolist():
+            # clip for rendering only; the box was already inflated by the last step()
+            tr = self._track(s)
+            np.clip(tr.smooth_bbox[0::2], 0.0, W, out=tr.smooth_bbox[0::2])
+            np.clip(tr.smooth_bbox[1::2], 0.0, H, out=tr.smooth_bbox[1::2])
+            x1, y1, x2, y2 = tr.smooth_bbox.tolist()
+            if x2 > x1 and y2 > y1:
+                active.append(tr)
+        return active
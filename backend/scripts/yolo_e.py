@@ -1,34 +1,145 @@
 from ultralytics import YOLOE
 from pathlib import Path
+import contextlib
 import cv2
-import glob
+import functools
+import gc
+import hashlib
+import importlib.util
+import itertools
 import os
-from typing import List, Tuple, Dict, Any, Optional, Union
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from typing import List, Tuple, Dict, Any, Iterator, Optional, Union
 import numpy as np
-from moviepy.editor import VideoFileClip
-from .tracker import BoxTracker
+import torch
+import torchvision
+from .tracker import BoxTracker, iou_matrix_cls
+
+# Optional: PyAV for threaded / hardware-accelerated decoding
+try:
+    import av
+    AV_AVAILABLE = True
+except Exception:
+    AV_AVAILABLE = False
+
+# Optional: Numba for the small-ROI pixelate kernel
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except Exception:
+    NUMBA_AVAILABLE = False
+
+MODEL_WEIGHTS = 'yoloe-11s-seg.pt'
+# Text prompt embeddings for `names` are cached here, keyed by weights + names
+TEXT_PE_CACHE_DIR = Path(os.getenv("YOLOE_TEXT_PE_CACHE_DIR", ".cache/yoloe"))
+
+# YOLOE_FORCE_CPU=1 hides the GPU from this process (saves its memory on hosts
+# that have one but should not use it); by default a GPU is used when present,
+# which is what enables the FP16 / TensorRT paths below
+YOLOE_FORCE_CPU = os.getenv("YOLOE_FORCE_CPU", "0") == "1"
+
+# Frames per YOLOE predict call in the video pipelines
+YOLOE_BATCH = int(os.getenv("YOLOE_BATCH", "8"))
+
+# On a GPU, the model (with `names` baked in) is exported once to a TensorRT
+# FP16 engine cached here; set YOLOE_TRT=0 to stay on PyTorch
+YOLOE_TRT = os.getenv("YOLOE_TRT", "1") != "0"
+ENGINE_CACHE_DIR = Path(os.getenv("YOLOE_ENGINE_CACHE_DIR", ".cache/yoloe"))
+ENGINE_IMGSZ = 640
+
+# YOLOE_INT8=1 also builds an INT8 model (a TensorRT engine on GPU, a statically
+# quantized ONNX model on CPU), calibrated on the HD candidate frames, and uses
+# it instead of the FP16 / FP32 one unless it loses more than INT8_MIN_RECALL
+# of that model's INT8_GUARD_CLASSES detections on held-out frames
+YOLOE_INT8 = os.getenv("YOLOE_INT8", "0") == "1"
+INT8_CALIB_IMAGES = 500
+INT8_ONNX_CALIB_IMAGES = 16  # ONNX Runtime calibrates in memory, on fewer frames
+INT8_HOLDOUT_EVERY = 5  # every 5th candidate frame is held out of calibration
+INT8_GUARD_CLASSES = ("license plate", "face")
+INT8_MIN_RECALL = 0.99
+
+# On CPU, the model (with `names` baked in) is exported once to ONNX, cached in
+# ENGINE_CACHE_DIR and run with ONNX Runtime when it is installed; YOLOE_ONNX=0
+# stays on PyTorch
+YOLOE_ONNX = os.getenv("YOLOE_ONNX", "1") != "0"
+
+# Letterbox video frames on the GPU with OpenCV's CUDA module when OpenCV is
+# built with it; set YOLOE_CV_CUDA=0 to always resize on the CPU
+YOLOE_CV_CUDA = os.getenv("YOLOE_CV_CUDA", "1") != "0"
+
+# Video frames larger than this (in pixels) are split into a 2x2 grid of tiles
+# overlapping by TILE_OVERLAP (of a tile's size) for detection, so small
+# objects keep enough pixels at imgsz; the tiles' boxes are merged with NMS
+TILE_MIN_PIXELS = 1920 * 1080
+TILE_GRID = (2, 2)
+TILE_OVERLAP = 0.1
+TILE_NMS_IOU = 0.5
 
 # Lazy model loading to avoid blocking startup
 _model = None
+# FP16 inference, only when the model ends up on a GPU (set by get_model)
+_half = False
+# Whether _model is a TensorRT engine, whose batch is capped at YOLOE_BATCH (set by get_model)
+_engine = False
+# Set once warmup_model has run, so the model is only warmed up once per process
+_warmed = False
+# Dummy passes in warmup_model: enough for cuDNN autotuning / graph capture to settle
+WARMUP_PASSES = 3
 
 def get_model():
     """Get the YOLO model, loading it lazily if needed"""
-    global _model
+    global _model, _half, _engine
     if _model is None:
         print("Loading YOLO model...")
         
-        # Set environment variables to reduce memory usage
-        import os
-        os.environ['CUDA_VISIBLE_DEVICES'] = ''  # Force CPU usage to save memory
+        # Set environment variables to reduce memory usage; hiding the GPU only
+        # takes effect before CUDA is first initialised, i.e. before the
+        # torch.cuda.is_available() below
+        if YOLOE_FORCE_CPU:
+            os.environ['CUDA_VISIBLE_DEVICES'] = ''  # Force CPU usage to save memory
         os.environ['OMP_NUM_THREADS'] = '1'  # Limit OpenMP threads
         
         # Load model with memory optimization
-        _model = YOLOE('yoloe-11s-seg.pt')
+        _model = YOLOE(MODEL_WEIGHTS)
         
-        # Optimize model for inference
-        _model.model.half()  # Use half precision to reduce memory
+        # Optimize model for inference: half precision on GPU (Ultralytics
+        # runs CPU inference in fp32 regardless)
+        _half = torch.cuda.is_available()
+        if _half:
+            _model.model.half()
         
         setup_model_classes()  # Setup classes after model is loaded
+        engine = False
+        if _half and YOLOE_TRT:
+            try:
+                fp16_engine = _load_engine(_model)
+                engine = True
+                if YOLOE_INT8:
+                    try:
+                        _model = _load_int8_engine(_model, fp16_engine) or fp16_engine
+                    except Exception as e:
+                        print(f"INT8 engine unavailable, using FP16: {e}")
+                        _model = fp16_engine
+                else:
+                    _model = fp16_engine
+            except Exception as e:
+                print(f"TensorRT engine unavailable, using PyTorch: {e}")
+        if not _half and YOLOE_ONNX and _onnx_available():
+            try:
+                fp32_onnx = _load_onnx(_model)
+                _model = fp32_onnx
+                if YOLOE_INT8:
+                    try:
+                        _model = _load_int8_onnx(fp32_onnx) or fp32_onnx
+                    except Exception as e:
+                        print(f"INT8 ONNX model unavailable, using FP32: {e}")
+            except Exception as e:
+                print(f"ONNX model unavailable, using PyTorch: {e}")
+        _engine = engine
         print("YOLO model loaded successfully!")
     return _model
 
@@ -55,11 +166,268 @@ names = ["traffic sign",
          "mirror",
          "ticket"
          ]
+def _text_pe_cache_path() -> Path:
+    key = hashlib.sha1("|".join([MODEL_WEIGHTS, *names]).encode()).hexdigest()
+    return TEXT_PE_CACHE_DIR / f"text_pe_{key}.pt"
+
+def _load_text_pe():
+    """
+    Text prompt embeddings for `names`, from the disk cache when present;
+    otherwise computed with the CLIP text encoder and cached.
+    """
+    path = _text_pe_cache_path()
+    if path.exists():
+        try:
+            return torch.load(path, map_location=_model.device)
+        except Exception as e:
+            print(f"Ignoring unreadable text embedding cache {path}: {e}")
+
+    pe = _model.get_text_pe(names)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write-then-rename: workers starting together never read a partial file
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        torch.save(pe.float().cpu(), tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not cache text embeddings to {path}: {e}")
+    return pe
+
+@functools.lru_cache(maxsize=1)
+def _weights_digest() -> str:
+    """sha256 of the weights file, so exports are rebuilt when it changes; its name if it is not on disk"""
+    path = Path(MODEL_WEIGHTS)
+    if not path.is_file():
+        return MODEL_WEIGHTS
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _engine_path(precision: str = "fp16") -> Path:
+    key = hashlib.sha1("|".join([
+        MODEL_WEIGHTS, _weights_digest(), *names, str(ENGINE_IMGSZ), str(YOLOE_BATCH),
+        torch.cuda.get_device_name(0),
+    ]).encode()).hexdigest()
+    return ENGINE_CACHE_DIR / f"{Path(MODEL_WEIGHTS).stem}_bs{YOLOE_BATCH}_{precision}_{key[:12]}.engine"
+
+def _load_engine(model):
+    """
+    TensorRT FP16 engine for `model`, whose classes must already be set: the
+    text embeddings are baked into the engine, so set_classes does not apply
+    to it. Exported on first use (dynamic batch up to YOLOE_BATCH) and cached.
+    """
+    path = _engine_path()
+    if not path.exists():
+        print(f"Exporting TensorRT engine to {path} (one-time)...")
+        exported = model.export(format="engine", half=True, dynamic=True, batch=YOLOE_BATCH,
+                                imgsz=ENGINE_IMGSZ, workspace=4)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(exported, path)
+    return YOLOE(str(path), task="segment")
+
+def _onnx_available() -> bool:
+    """ONNX export and inference need onnx and onnxruntime (Ultralytics would pip-install them otherwise)"""
+    return all(importlib.util.find_spec(m) is not None for m in ("onnx", "onnxruntime"))
+
+def _onnx_path(precision: str = "fp32") -> Path:
+    key = hashlib.sha1("|".join([MODEL_WEIGHTS, _weights_digest(), *names, str(ENGINE_IMGSZ)]).encode()).hexdigest()
+    return ENGINE_CACHE_DIR / f"{Path(MODEL_WEIGHTS).stem}_{precision}_{key[:12]}.onnx"
+
+def _load_onnx(model):
+    """
+    ONNX export of `model` for CPU inference through ONNX Runtime; classes must
+    already be set, as for _load_engine. Exported on first use (dynamic batch)
+    and cached.
+    """
+    path = _onnx_path()
+    if not path.exists():
+        print(f"Exporting ONNX model to {path} (one-time)...")
+        exported = model.export(format="onnx", dynamic=True, simplify=True, imgsz=ENGINE_IMGSZ)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(exported, path)
+    return YOLOE(str(path), task="segment")
+
+def warmup_model(model, passes: int = WARMUP_PASSES) -> None:
+    """
+    Dummy predicts in the shapes the pipelines use: a YOLOE_BATCH x
+    ENGINE_IMGSZ tensor batch, as the video path feeds, and a 720p BGR image,
+    as image uploads do. Moves engine / CUDA graph setup and autotuning off
+    the first request. No-op after the first call in a process. Prints the
+    first and last pass times, so a slow warm-up (or a steady state that
+    regressed) shows in the logs.
+    """
+    global _warmed
+    if _warmed:
+        return
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    batch = torch.zeros((YOLOE_BATCH, 3, ENGINE_IMGSZ, ENGINE_IMGSZ),
+                        dtype=torch.float16 if _half else torch.float32, device=device)
+    image = np.zeros((720, 1280, 3), dtype=np.uint8)
+    times = []
+    for _ in range(passes):
+        start = time.perf_counter()
+        predict(model, batch, imgsz=ENGINE_IMGSZ)
+        predict(model, image, imgsz=ENGINE_IMGSZ)
+        if device == "cuda":
+            torch.cuda.synchronize()
+        times.append(time.perf_counter() - start)
+    del batch, image
+    gc.collect()
+    _warmed = True
+    if times:
+        print(f"YOLO warm-up: first pass {times[0] * 1000:.0f} ms, last pass {times[-1] * 1000:.0f} ms")
+
+def _int8_frames() -> Tuple[List[str], List[str]]:
+    """(calibration, held-out) frame paths from the HD candidate frames"""
+    frames = sorted(itertools.islice(get_candidate_frame_paths(True)[0],
+                                     INT8_CALIB_IMAGES * INT8_HOLDOUT_EVERY // (INT8_HOLDOUT_EVERY - 1)))
+    calib = [f for i, f in enumerate(frames) if i % INT8_HOLDOUT_EVERY]
+    return calib, frames[::INT8_HOLDOUT_EVERY]
+
+def _int8_calib_data() -> Tuple[Optional[Path], List[str]]:
+    """
+    (dataset yaml for INT8 calibration, held-out frame paths) from the HD
+    candidate frames; (None, []) when there are none. The calibration frames
+    are symlinked into ENGINE_CACHE_DIR/calib, which the yaml points at.
+    """
+    calib, holdout = _int8_frames()
+    if not calib:
+        return None, []
+    calib_dir = (ENGINE_CACHE_DIR / "calib").resolve()
+    shutil.rmtree(calib_dir, ignore_errors=True)
+    calib_dir.mkdir(parents=True)
+    for i, f in enumerate(calib):
+        try:
+            os.symlink(os.path.abspath(f), calib_dir / f"{i:04d}.jpg")
+        except OSError:
+            shutil.copy(f, calib_dir / f"{i:04d}.jpg")
+    data = ENGINE_CACHE_DIR / "calib.yaml"
+    data.write_text(
+        f"path: {calib_dir}\ntrain: .\nval: .\nnames:\n"
+        + "".join(f"  {i}: {n}\n" for i, n in enumerate(names))
+    )
+    return data, holdout
+
+def _guard_recall(reference, candidate, paths: List[str]) -> float:
+    """
+    Share of `reference`'s INT8_GUARD_CLASSES detections on the images at
+    `paths` that `candidate` also finds (same class, IoU >= 0.5); 1.0 when
+    there are none.
+    """
+    guard = [i for i, n in enumerate(names) if n in INT8_GUARD_CLASSES]
+    found = total = 0
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        ref_xyxy, _, ref_cls = boxes_to_numpy(predict(reference, img, imgsz=ENGINE_IMGSZ)[0])
+        keep = np.isin(ref_cls, guard)
+        if not keep.any():
+            continue
+        xyxy, _, cls = boxes_to_numpy(predict(candidate, img, imgsz=ENGINE_IMGSZ)[0])
+        total += int(keep.sum())
+        if len(xyxy):
+            found += int((iou_matrix_cls(ref_xyxy[keep], ref_cls[keep], xyxy, cls).max(axis=1) >= 0.5).sum())
+    return found / total if total else 1.0
+
+def _load_int8_engine(model, fp16_engine):
+    """
+    INT8 TensorRT engine for `model` (classes set, as for _load_engine), or
+    None when there is nothing to calibrate on or it was rejected. Exported
+    once, then checked against `fp16_engine` with _guard_recall; a rejected
+    engine is replaced by a ".rejected" marker so it is not rebuilt.
+    """
+    path = _engine_path("int8")
+    rejected = path.with_suffix(".rejected")
+    if rejected.exists():
+        return None
+    if not path.exists():
+        data, holdout = _int8_calib_data()
+        if data is None:
+            print("No candidate frames to calibrate INT8 on, using FP16")
+            return None
+        print(f"Exporting INT8 TensorRT engine to {path} (one-time)...")
+        exported = model.export(format="engine", int8=True, data=str(data), dynamic=True, batch=YOLOE_BATCH,
+                                imgsz=ENGINE_IMGSZ, workspace=4)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(exported, path)
+        int8_engine = YOLOE(str(path), task="segment")
+        recall = _guard_recall(fp16_engine, int8_engine, holdout)
+        print(f"INT8 recall of FP16 {'/'.join(INT8_GUARD_CLASSES)} detections: {recall:.3f}")
+        if recall < INT8_MIN_RECALL:
+            path.unlink()
+            rejected.touch()
+            return None
+        return int8_engine
+    return YOLOE(str(path), task="segment")
+
+def _load_int8_onnx(fp32_onnx):
+    """
+    CPU counterpart of _load_int8_engine: _onnx_path()'s model statically
+    quantized to INT8 (QDQ, per-channel weights; VNNI kernels where the CPU has
+    them) by ONNX Runtime, calibrated on INT8_ONNX_CALIB_IMAGES letterboxed
+    candidate frames, then checked against `fp32_onnx` the same way.
+    """
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    path = _onnx_path("int8")
+    rejected = path.with_suffix(".rejected")
+    if rejected.exists():
+        return None
+    if not path.exists():
+        calib, holdout = _int8_frames()
+        calib = calib[:INT8_ONNX_CALIB_IMAGES]
+        if not calib:
+            print("No candidate frames to calibrate INT8 on, using FP32")
+            return None
+        src = _onnx_path()
+        input_name = InferenceSession(str(src), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+        class _Frames(CalibrationDataReader):
+            def __init__(self):
+                self.paths = iter(calib)
+
+            def get_next(self):
+                for p in self.paths:
+                    img = cv2.imread(p)
+                    if img is not None:
+                        H, W = img.shape[:2]
+                        batch = _TensorFeeder((W, H), ENGINE_IMGSZ, 1, torch.device("cpu")).upload([img])
+                        return {input_name: batch.numpy().copy()}
+                return None
+
+        print(f"Quantizing ONNX model to INT8 at {path} (one-time)...")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        quantize_static(str(src), str(path), _Frames(), quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+        int8_onnx = YOLOE(str(path), task="segment")
+        recall = _guard_recall(fp32_onnx, int8_onnx, holdout)
+        print(f"INT8 recall of FP32 {'/'.join(INT8_GUARD_CLASSES)} detections: {recall:.3f}")
+        if recall < INT8_MIN_RECALL:
+            path.unlink()
+            rejected.touch()
+            return None
+        return int8_onnx
+    return YOLOE(str(path), task="segment")
+
 # Model class setup will be done when model is loaded
 def setup_model_classes():
     """Setup model classes when model is loaded"""
     if _model is not None:
-        _model.set_classes(names, _model.get_text_pe(names))
+        pe = _load_text_pe()
+        _model.set_classes(names, pe.half() if _half else pe)
+
+def predict(model, source, imgsz: int = 640, conf: float = 0.25, verbose: bool = False):
+    """
+    model.predict under torch.inference_mode; on GPU with FP16 weights/inputs
+    (half=True) and autocast for the ops that would otherwise run in FP32.
+    """
+    amp = torch.autocast("cuda", dtype=torch.float16) if _half else contextlib.nullcontext()
+    with torch.inference_mode(), amp:
+        return model.predict(source=source, imgsz=imgsz, conf=conf, half=_half, verbose=verbose)
 
 HD_CANDIDATE_FRAME_DIR = "backend/data/hd_candidate_frames"
 CANDIDATE_FRAME_DIR = "backend/data/candidate_frames"
@@ -67,13 +435,35 @@ CANDIDATE_FRAME_DIR = "backend/data/candidate_frames"
 HD_CANDIDATE_FRAME_OUT_DIR = "backend/data/hd_candidate_frames/output"
 CANDIDATE_FRAME_OUT_DIR = "backend/data/candidate_frames/output"
 
-def get_candidate_frame_paths(isHD) -> Tuple[List[str], str]:
+def _iter_jpg_paths(directory: str) -> Iterator[str]:
+    """Lazily yield the paths glob's "*.jpg" would match in `directory`, without a stat() per entry"""
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith(".jpg") and not entry.name.startswith("."):
+                    yield entry.path
+    except FileNotFoundError:
+        return
+
+def get_candidate_frame_paths(isHD) -> Tuple[Iterator[str], str]:
     if isHD:
-        return glob.glob(os.path.join(HD_CANDIDATE_FRAME_DIR, "*.jpg")), HD_CANDIDATE_FRAME_OUT_DIR
+        return _iter_jpg_paths(HD_CANDIDATE_FRAME_DIR), HD_CANDIDATE_FRAME_OUT_DIR
     else:
-        return glob.glob(os.path.join(CANDIDATE_FRAME_DIR, "*.jpg")), CANDIDATE_FRAME_OUT_DIR
+        return _iter_jpg_paths(CANDIDATE_FRAME_DIR), CANDIDATE_FRAME_OUT_DIR
     
 
+def boxes_to_numpy(r: Any) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (xyxy (N,4), conf (N,), cls (N,) int) of a YOLOE result, pulled off the
+    device in one transfer of `r.boxes.data` ([..., conf, cls] rows). Results
+    without boxes give empty arrays.
+    """
+    boxes = getattr(r, "boxes", None)
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int32)
+    data = boxes.data.float().cpu().numpy()
+    return data[:, :4], data[:, -2], data[:, -1].astype(np.int32)
+
 def run_image(
     model,
     img_path: str,
@@ -105,21 +495,18 @@ def run_image(
         raise FileNotFoundError(f"Could not read image at {img_path}")
 
     # Inference
-    results = model.predict(source=img, imgsz=imgsz, conf=conf, verbose=verbose)
+    results = predict(model, img, imgsz=imgsz, conf=conf, verbose=verbose)
     r = results[0]
 
     dets: List[Dict[str, Any]] = []
-    if r.boxes is not None and len(r.boxes) > 0:
-        xyxy = r.boxes.xyxy.cpu().numpy()
-        confs = r.boxes.conf.cpu().numpy()
-        clss = r.boxes.cls.cpu().numpy().astype(int)
-        for box, c, k in zip(xyxy, confs, clss):
-            dets.append({
-                "xyxy": box.tolist(),
-                "conf": float(c),
-                "cls": int(k),
-                "name": r.names.get(int(k), str(int(k))),  # r.names is dict
-            })
+    xyxy, confs, clss = boxes_to_numpy(r)
+    for box, c, k in zip(xyxy, confs, clss):
+        dets.append({
+            "xyxy": box.tolist(),
+            "conf": float(c),
+            "cls": int(k),
+            "name": r.names.get(int(k), str(int(k))),  # r.names is dict
+        })
 
     # Annotate
     annotated = r.plot()
@@ -134,6 +521,49 @@ def run_image(
 
     return dets
 
+# Mosaic resizes go through OpenCL (cv2.UMat) when available, except for
+# images under this many pixels, where the upload costs more than it saves
+UMAT_MIN_PIXELS = 256 * 256
+_USE_UMAT = cv2.ocl.haveOpenCL()
+
+def _mosaic(img: np.ndarray, pixel_size: int) -> np.ndarray:
+    """Blocky copy of img: area-averaged downscale by pixel_size, nearest-neighbor upscale"""
+    h, w = img.shape[:2]
+    src = cv2.UMat(img) if _USE_UMAT and h * w >= UMAT_MIN_PIXELS else img
+    small = cv2.resize(src, (max(1, w // pixel_size), max(1, h // pixel_size)), interpolation=cv2.INTER_AREA)
+    big = cv2.resize(small, (w, h), interpolation=cv2.INTER_NEAREST)
+    return big.get() if isinstance(big, cv2.UMat) else big
+
+# ROIs under this many pixels are pixelated by the Numba kernel (when available),
+# where the two cv2.resize calls cost more in dispatch than in work
+NUMBA_MAX_ROI_PIXELS = 64 * 64
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def _pixelate_block_nb(img, x1, y1, x2, y2, block):
+        """
+        Fill every `block` x `block` cell of img[y1:y2, x1:x2] (edge cells
+        clipped) with its mean colour, in place.
+        """
+        for by in prange((y2 - y1 + block - 1) // block):
+            y0 = y1 + by * block
+            ye = min(y0 + block, y2)
+            for x0 in range(x1, x2, block):
+                xe = min(x0 + block, x2)
+                n = (ye - y0) * (xe - x0)
+                for c in range(img.shape[2]):
+                    s = 0
+                    for y in range(y0, ye):
+                        for x in range(x0, xe):
+                            s += int(img[y, x, c])  # widen: uint8 sums overflow
+                    v = (s + n // 2) // n
+                    for y in range(y0, ye):
+                        for x in range(x0, xe):
+                            img[y, x, c] = v
+
+    # Compile at import rather than on the first frame
+    _pixelate_block_nb(np.zeros((4, 4, 3), dtype=np.uint8), 0, 0, 4, 4, 2)
+
 def apply_pixelation(img, xi1, yi1, xi2, yi2, pixel_size: int = 10):
     """
     Apply pixelation (mosaic) to the region [yi1:yi2, xi1:xi2] of img.
@@ -149,14 +579,33 @@ def apply_pixelation(img, xi1, yi1, xi2, yi2, pixel_size: int = 10):
     if h == 0 or w == 0:
         return img  # skip invalid boxes
 
-    # Downscale to (w//pixel_size, h//pixel_size)
-    temp = cv2.resize(roi, (max(1, w // pixel_size), max(1, h // pixel_size)), interpolation=cv2.INTER_LINEAR)
-
-    # Upscale back to original ROI size with nearest-neighbor → blocky look
-    pixelated = cv2.resize(temp, (w, h), interpolation=cv2.INTER_NEAREST)
+    # Small boxes: average the blocks in place
+    if NUMBA_AVAILABLE and h * w < NUMBA_MAX_ROI_PIXELS and xi1 >= 0 and yi1 >= 0 and img.ndim == 3:
+        _pixelate_block_nb(img, xi1, yi1, xi1 + w, yi1 + h, pixel_size)
+        return img
 
     # Replace region in original image
-    img[yi1:yi2, xi1:xi2] = pixelated
+    img[yi1:yi2, xi1:xi2] = _mosaic(roi, pixel_size)
+    return img
+
+def pixelate_regions(img, boxes, pixel_size: int = 10):
+    """
+    Pixelate every (x1, y1, x2, y2) box of img in place with one full-frame
+    downsample+upsample, composited through a mask of all boxes (overlapping
+    boxes are processed once). The mosaic grid is aligned to the frame; a
+    lone box goes through apply_pixelation on its ROI instead.
+    """
+    if not boxes:
+        return img
+    if len(boxes) == 1:
+        # a single box: resizing just its ROI beats a full-frame pass plus mask
+        return apply_pixelation(img, *boxes[0], pixel_size=pixel_size)
+    H, W = img.shape[:2]
+    mask = np.zeros((H, W), dtype=bool)
+    for xi1, yi1, xi2, yi2 in boxes:
+        mask[yi1:yi2, xi1:xi2] = True
+
+    np.copyto(img, _mosaic(img, pixel_size), where=mask[:, :, None])
     return img
 
 
@@ -199,36 +648,32 @@ def run_image_pixelate(
         raise FileNotFoundError(f"Could not read image at {img_path}")
 
     # Inference on the already-loaded NumPy image
-    results = model.predict(source=img, imgsz=imgsz, conf=conf, verbose=verbose)
+    results = predict(model, img, imgsz=imgsz, conf=conf, verbose=verbose)
     r = results[0]
 
     # Prepare detections list
     dets: List[Dict[str, Any]] = []
     H, W = img.shape[:2]
-    out_img = img.copy()
-
-    if r.boxes is not None and len(r.boxes) > 0:
-        xyxy = r.boxes.xyxy.cpu().numpy()
-        confs = r.boxes.conf.cpu().numpy()
-        clss  = r.boxes.cls.cpu().numpy().astype(int)
-
-        for (x1, y1, x2, y2), c, k in zip(xyxy, confs, clss):
-            # Clip + pad bbox
-            xi1 = max(0, int(np.floor(x1)) - padding_px)
-            yi1 = max(0, int(np.floor(y1)) - padding_px)
-            xi2 = min(W, int(np.ceil(x2)) + padding_px)
-            yi2 = min(H, int(np.ceil(y2)) + padding_px)
-            
-            if xi2 - xi1 > 1 and yi2 - yi1 > 1:
-                out_img = apply_pixelation(out_img, xi1, yi1, xi2, yi2, pixel_size=pixel_size)
-
-
-            dets.append({
-                "xyxy": [float(x1), float(y1), float(x2), float(y2)],
-                "conf": float(c),
-                "cls":  int(k),
-                "name": r.names.get(int(k), str(int(k))),  # r.names is a dict
-            })
+    out_img = img  # freshly read and not used otherwise, so pixelated in place
+
+    xyxy, confs, clss = boxes_to_numpy(r)
+    # Pad + clip all bboxes at once (floor/ceil outwards)
+    xyxy_int = np.empty(xyxy.shape, dtype=np.int64)
+    xyxy_int[:, :2] = np.floor(xyxy[:, :2]) - padding_px
+    xyxy_int[:, 2:] = np.ceil(xyxy[:, 2:]) + padding_px
+    np.clip(xyxy_int, 0, [W, H, W, H], out=xyxy_int)
+    keep = (xyxy_int[:, 2] - xyxy_int[:, 0] > 1) & (xyxy_int[:, 3] - xyxy_int[:, 1] > 1)
+    boxes = [tuple(b) for b in xyxy_int[keep].tolist()]
+
+    for box, c, k in zip(xyxy.tolist(), confs.tolist(), clss.tolist()):
+        dets.append({
+            "xyxy": box,
+            "conf": c,
+            "cls":  k,
+            "name": r.names.get(k, str(k)),  # r.names is a dict
+        })
+
+    out_img = pixelate_regions(out_img, boxes, pixel_size=pixel_size)
 
     # Save output with "_output" suffix
     if save:
@@ -249,47 +694,561 @@ def _pixelate_frame_with_yoloe(
     conf: float = 0.25,
     verbose: bool = False,
     pixel_size: int = 12,
+    copy: bool = False,
 ) -> Tuple[np.ndarray, Dict[str, List[Tuple[int, int, int, int]]]]:
     """
     Frame-level variant: runs YOLOE on a BGR frame and pixelates every detected region.
     Detection set is already constrained by model.set_classes(...).
+    `frame_bgr` is pixelated in place and returned; pass copy=True to keep it intact.
     """
-    H, W = frame_bgr.shape[:2]
-    out_img = frame_bgr.copy()
+    return _pixelate_frames_batch_with_yoloe(
+        model, [frame_bgr], tracker, imgsz=imgsz, conf=conf, verbose=verbose, pixel_size=pixel_size, copy=copy
+    )[0]
 
-    results = model.predict(source=out_img, imgsz=imgsz, conf=conf, verbose=verbose)
-    r = results[0]
+def _pixelate_frames_batch_with_yoloe(
+    model,
+    frames_bgr: List[np.ndarray],
+    tracker: Any,
+    imgsz: int = 640,
+    conf: float = 0.25,
+    verbose: bool = False,
+    pixel_size: int = 12,
+    copy: bool = False,
+) -> List[Tuple[np.ndarray, Dict[str, List[Tuple[int, int, int, int]]]]]:
+    """
+    Batch variant of _pixelate_frame_with_yoloe: one predict call for all of
+    `frames_bgr`, then the tracker steps through the results in frame order.
+    Frames are pixelated in place unless copy=True.
+    """
+    out_imgs = [f.copy() for f in frames_bgr] if copy else list(frames_bgr)
+    results = predict(model, out_imgs, imgsz=imgsz, conf=conf, verbose=verbose)
+    return [_pixelate_tracked(img, r, tracker, pixel_size=pixel_size) for img, r in zip(out_imgs, results)]
 
+def _pixelate_tracked(
+    out_img: np.ndarray,
+    r: Any,
+    tracker: Any,
+    pixel_size: int = 12,
+    box_map: Optional[Any] = None,
+) -> Tuple[np.ndarray, Dict[str, List[Tuple[int, int, int, int]]]]:
+    """
+    Feeds one frame's YOLOE result `r` to the tracker and pixelates the active
+    tracks into `out_img` in place. `box_map` maps the result's (N,4) xyxy
+    boxes to `out_img` coordinates when inference ran on a resized input.
+    """
     # Inside your per-frame pipeline, after YOLOE inference:
-    # Build detections list like your dets = [...]
-    detections = []
-    if r.boxes is not None and len(r.boxes) > 0:
-        xyxy = r.boxes.xyxy.cpu().numpy()
-        confs = r.boxes.conf.cpu().numpy()
-        clss  = r.boxes.cls.cpu().numpy().astype(int)
-        for (x1, y1, x2, y2), c, k in zip(xyxy, confs, clss):
-            detections.append({
-                "xyxy": [float(x1), float(y1), float(x2), float(y2)],
-                "conf": float(c),
-                "name": r.names.get(int(k), str(int(k)))
-            })
+    # detections go to the tracker as parallel arrays
+    xyxy, confs, clss = boxes_to_numpy(r)
+    if box_map is not None and len(xyxy):
+        xyxy = box_map(xyxy)
 
     H, W = out_img.shape[:2]
-    active_tracks = tracker.step(detections, (W, H))
-    
+    active_tracks = tracker.step(xyxy, confs, clss, (W, H), names=r.names)
+    return _render_tracks(out_img, active_tracks, pixel_size=pixel_size)
+
+def _tile_origins(frame_size: Tuple[int, int]) -> Tuple[Tuple[int, int], List[Tuple[int, int]]]:
+    """(tile (w, h), top-left (x, y) of every tile) of the TILE_GRID covering a frame of `frame_size`"""
+    W, H = frame_size
+    cols, rows = TILE_GRID
+    tw = int(np.ceil(W / (cols - (cols - 1) * TILE_OVERLAP)))
+    th = int(np.ceil(H / (rows - (rows - 1) * TILE_OVERLAP)))
+    xs = np.linspace(0, W - tw, cols).round().astype(int).tolist()
+    ys = np.linspace(0, H - th, rows).round().astype(int).tolist()
+    return (tw, th), [(x, y) for y in ys for x in xs]
+
+def _pixelate_tiled(
+    out_img: np.ndarray,
+    tile_results: List[Any],
+    origins: List[Tuple[int, int]],
+    tracker: Any,
+    pixel_size: int = 12,
+    box_map: Optional[Any] = None,
+) -> Tuple[np.ndarray, Dict[str, List[Tuple[int, int, int, int]]]]:
+    """
+    _pixelate_tracked for a frame detected as tiles: `tile_results[i]` is the
+    YOLOE result for the tile at `origins[i]` (`box_map` maps its boxes to
+    tile coordinates). Boxes are shifted into the frame, and duplicates from
+    the overlaps are dropped with per-class NMS before the tracker step.
+    """
+    parts = []
+    for r, (x, y) in zip(tile_results, origins):
+        xyxy, confs, clss = boxes_to_numpy(r)
+        if len(xyxy):
+            if box_map is not None:
+                xyxy = box_map(xyxy)
+            parts.append((xyxy + np.array([x, y, x, y], dtype=np.float32), confs, clss))
+    if parts:
+        xyxy, confs, clss = (np.concatenate(a) for a in zip(*parts))
+        keep = torchvision.ops.batched_nms(
+            torch.from_numpy(xyxy), torch.from_numpy(confs), torch.from_numpy(clss), TILE_NMS_IOU
+        ).numpy()
+        xyxy, confs, clss = xyxy[keep], confs[keep], clss[keep]
+    else:
+        xyxy, confs, clss = np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int32)
+
+    H, W = out_img.shape[:2]
+    active_tracks = tracker.step(xyxy, confs, clss, (W, H), names=tile_results[0].names)
+    return _render_tracks(out_img, active_tracks, pixel_size=pixel_size)
+
+def _render_tracks(
+    out_img: np.ndarray,
+    active_tracks: List[Any],
+    pixel_size: int = 12,
+) -> Tuple[np.ndarray, Dict[str, List[Tuple[int, int, int, int]]]]:
+    """Pixelates `active_tracks` into `out_img` in place; returns it with the boxes by class"""
     active_bbox_dict = {}
 
     # Render stabilized censorship:
+    boxes = []
     for tr in active_tracks:
-        x1, y1, x2, y2 = tr.smooth_bbox.astype(int)
+        x1, y1, x2, y2 = tr.smooth_bbox.astype(int).tolist()
         tr_class = tr.cls_name
-        out_img = apply_pixelation(out_img, x1, y1, x2, y2, pixel_size=pixel_size)
+        boxes.append((x1, y1, x2, y2))
         if tr_class not in active_bbox_dict:
             active_bbox_dict[tr_class] = []
         active_bbox_dict[tr_class].append((x1, y1, x2, y2))
+    out_img = pixelate_regions(out_img, boxes, pixel_size=pixel_size)
 
     return out_img, active_bbox_dict
 
+class AvVideoReader:
+    """
+    Video decoder on PyAV with the cv2.VideoCapture read/get/release interface.
+    Decodes with frame threading, on the GPU (NVDEC) when PyAV and FFmpeg
+    support it, and hands out BGR frames directly.
+    """
+    def __init__(self, path: str):
+        self.container = None
+        if torch.cuda.is_available():
+            try:
+                from av.codec.hwaccel import HWAccel
+                self.container = av.open(path, hwaccel=HWAccel(device_type="cuda", allow_software_fallback=True))
+            except Exception:
+                self.container = None
+        if self.container is None:
+            self.container = av.open(path)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"
+        self._frames = self.container.decode(self.stream)
+
+    def isOpened(self) -> bool:
+        return True
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.stream.average_rate or 0)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.stream.codec_context.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.stream.codec_context.height)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            # Containers without a frame count report 0: estimate it from the
+            # duration (0 still means unknown)
+            if self.stream.frames:
+                return float(self.stream.frames)
+            if self.stream.duration and self.stream.time_base and self.stream.average_rate:
+                return float(round(self.stream.duration * self.stream.time_base * self.stream.average_rate))
+            if self.container.duration and self.stream.average_rate:
+                return float(round(self.container.duration / av.time_base * self.stream.average_rate))
+            return 0.0
+        return 0.0
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        try:
+            frame = next(self._frames)
+        except StopIteration:
+            return False, None
+        return True, frame.to_ndarray(format="bgr24")
+
+    def release(self) -> None:
+        self.container.close()
+
+def open_video_capture(path: str):
+    """
+    AvVideoReader when PyAV is installed and can open `path`, else a cv2.VideoCapture.
+    """
+    if AV_AVAILABLE:
+        try:
+            return AvVideoReader(path)
+        except Exception as e:
+            print(f"PyAV could not open {path} ({e}), falling back to cv2.VideoCapture")
+    return cv2.VideoCapture(path)
+
+def _read_batches(cap, batch_size: int):
+    """Yield lists of up to `batch_size` BGR frames read from `cap`"""
+    while True:
+        frames = []
+        while len(frames) < batch_size:
+            ok, frame_bgr = cap.read()
+            if not ok:
+                break
+            frames.append(frame_bgr)
+        if not frames:
+            return
+        yield frames
+        if len(frames) < batch_size:
+            return
+
+def _put_unless(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """q.put(item), giving up (False) once `stop` is set"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _threaded(iterable, maxsize: int):
+    """
+    Iterate `iterable` on a background thread, handing items over through a
+    bounded queue (so it runs at most `maxsize` items ahead); exceptions are
+    re-raised in the consumer.
+    """
+    q: queue.Queue = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                if not _put_unless(q, (item, None), stop):
+                    return
+            _put_unless(q, (done, None), stop)
+        except BaseException as e:
+            _put_unless(q, (done, e), stop)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = q.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+class ThreadedWriter:
+    """
+    Runs `writer.write` on a background thread fed by a bounded queue, so
+    encoding overlaps the next frames' inference. Same write/release interface;
+    a write error is raised from the next write() or from release().
+    """
+    def __init__(self, writer: Any, maxsize: int):
+        self.writer = writer
+        self.error: Optional[BaseException] = None
+        self.q: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        while True:
+            frame = self.q.get()
+            if frame is None:
+                return
+            if self.error is None:  # keep draining after an error so write() never blocks
+                try:
+                    self.writer.write(frame)
+                except BaseException as e:
+                    self.error = e
+
+    def write(self, frame_bgr: np.ndarray) -> None:
+        if self.error is not None:
+            raise self.error
+        self.q.put(frame_bgr)
+
+    def release(self) -> None:
+        self.q.put(None)
+        self.thread.join()
+        self.writer.release()
+        if self.error is not None:
+            raise self.error
+
+    def abort(self) -> None:
+        """Stop without finishing the output (after an error): see FfmpegPipeWriter.abort"""
+        # Abort first: it unblocks a write stuck on the encoder, so the thread can drain
+        self.writer.abort()
+        if self.thread.is_alive():
+            self.q.put(None)
+            self.thread.join()
+
+def _thumb_gray(frame_bgr: np.ndarray) -> np.ndarray:
+    """Small grayscale thumbnail used for frame-difference checks"""
+    return cv2.resize(cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY), (64, 36), interpolation=cv2.INTER_AREA)
+
+def _cv_cuda_available() -> bool:
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except Exception:
+        return False
+
+class _CudaArray:
+    """
+    __cuda_array_interface__ view of a CV_8UC3 cv2.cuda_GpuMat, so torch can
+    wrap its device memory without a copy.
+    """
+    def __init__(self, mat: Any):
+        w, h = mat.size()
+        self.mat = mat  # keeps the device memory alive
+        self.__cuda_array_interface__ = {
+            "shape": (h, w, 3),
+            "typestr": "|u1",
+            "data": (mat.cudaPtr(), False),
+            "strides": (mat.step1() * mat.elemSize1(), 3, 1),
+            "version": 3,
+        }
+
+class _TensorFeeder:
+    """
+    Letterboxes fixed-size video frames to imgsz x imgsz (aspect kept, gray
+    padding, like Ultralytics does) into BCHW tensors YOLOE takes as-is, and
+    maps the resulting boxes back to frame coordinates.
+
+    Scale and padding are computed once; frames are resized straight into a
+    preallocated canvas whose border is filled once, and each batch is
+    converted to RGB float in a single tensor op.
+
+    On a GPU the tensors are staged in pinned host memory and copied to the
+    device on a side stream, so the upload of the next batch overlaps inference
+    of the current one. Two staging buffers alternate between those two batches.
+
+    When OpenCV has CUDA (see YOLOE_CV_CUDA), frames are uploaded as-is and
+    resized on the GPU into a device canvas that torch reads in place instead.
+    """
+    def __init__(self, frame_size: Tuple[int, int], imgsz: int, batch_size: int, device: torch.device):
+        W, H = frame_size
+        self.frame_w, self.frame_h = W, H
+        self.scale = min(imgsz / W, imgsz / H)
+        self.new_w, self.new_h = int(round(W * self.scale)), int(round(H * self.scale))
+        self.pad_x, self.pad_y = (imgsz - self.new_w) // 2, (imgsz - self.new_h) // 2
+        self.device = device
+        self.canvas = np.full((batch_size, imgsz, imgsz, 3), 114, dtype=np.uint8)
+        cuda = device.type == "cuda"
+        dtype = torch.float16 if _half else torch.float32
+        self.slot = 0
+        self.gpu_cv = cuda and YOLOE_CV_CUDA and _cv_cuda_available()
+        if self.gpu_cv:
+            self.gpu_frame = cv2.cuda_GpuMat(H, W, cv2.CV_8UC3)
+            self.gpu_canvas = cv2.cuda_GpuMat(imgsz, imgsz, cv2.CV_8UC3, (114, 114, 114))
+            self.gpu_roi = cv2.cuda_GpuMat(self.gpu_canvas, (self.pad_x, self.pad_y, self.new_w, self.new_h))
+            self.canvas_t = torch.as_tensor(_CudaArray(self.gpu_canvas), device=device)
+            self.dev = [torch.empty((batch_size, 3, imgsz, imgsz), dtype=dtype, device=device) for _ in range(2)]
+            self.stream = None
+        else:
+            self.host = [torch.empty((batch_size, 3, imgsz, imgsz), dtype=dtype, pin_memory=cuda) for _ in range(2)]
+            self.stream = torch.cuda.Stream(device) if cuda else None
+
+    def upload(self, frames: List[np.ndarray]) -> torch.Tensor:
+        """Letterbox `frames` and start their upload; pass the result through `ready` before use"""
+        n = len(frames)
+        if self.gpu_cv:
+            return self._upload_gpu_cv(frames)
+        y1, x1 = self.pad_y, self.pad_x
+        for i, frame_bgr in enumerate(frames):
+            cv2.resize(frame_bgr, (self.new_w, self.new_h),
+                       dst=self.canvas[i, y1:y1 + self.new_h, x1:x1 + self.new_w],
+                       interpolation=cv2.INTER_LINEAR)
+        host = self.host[self.slot][:n]
+        self.slot ^= 1
+        # BGR NHWC uint8 -> RGB NCHW in [0, 1]
+        host.copy_(torch.from_numpy(self.canvas[:n]).permute(0, 3, 1, 2).flip(1)).div_(255.0)
+        if self.stream is None:
+            return host
+        with torch.cuda.stream(self.stream):
+            return host.to(self.device, non_blocking=True)
+
+    def _upload_gpu_cv(self, frames: List[np.ndarray]) -> torch.Tensor:
+        batch = self.dev[self.slot][:len(frames)]
+        self.slot ^= 1
+        for i, frame_bgr in enumerate(frames):
+            self.gpu_frame.upload(frame_bgr)
+            cv2.cuda.resize(self.gpu_frame, (self.new_w, self.new_h), dst=self.gpu_roi,
+                            interpolation=cv2.INTER_LINEAR)
+            # BGR HWC uint8 -> RGB CHW, on the device
+            batch[i].copy_(self.canvas_t.permute(2, 0, 1).flip(0))
+        return batch.div_(255.0)
+
+    def ready(self, batch: torch.Tensor) -> torch.Tensor:
+        """Make the default stream wait for `batch`'s upload"""
+        if self.stream is None:
+            return batch
+        current = torch.cuda.current_stream(self.device)
+        current.wait_stream(self.stream)
+        batch.record_stream(current)
+        return batch
+
+    def unletterbox(self, xyxy: np.ndarray) -> np.ndarray:
+        """Map (N,4) boxes on the letterboxed input back to the original frame"""
+        xyxy = (xyxy - np.array([self.pad_x, self.pad_y, self.pad_x, self.pad_y], dtype=np.float32)) / self.scale
+        np.clip(xyxy[:, 0::2], 0, self.frame_w, out=xyxy[:, 0::2])
+        np.clip(xyxy[:, 1::2], 0, self.frame_h, out=xyxy[:, 1::2])
+        return xyxy
+
+def _censor_frames(
+    model,
+    cap,
+    tracker: Any,
+    imgsz: int,
+    conf: float,
+    verbose: bool,
+    pixel_size: int,
+    batch_size: int,
+    detect_every: int,
+    scene_diff_thresh: float,
+    tile: bool = True,
+):
+    """
+    Yield (pixelated frame, active bbox dict) for every frame of `cap`.
+
+    YOLOE (batched) only runs on every `detect_every`-th frame, and on any frame
+    whose mean abs difference from the previous one exceeds `scene_diff_thresh`;
+    the frames in between are censored where the tracker extrapolates its
+    tracks (BoxTracker.step_no_detections).
+
+    With `tile`, frames over TILE_MIN_PIXELS are detected as TILE_GRID tiles
+    (see _pixelate_tiled) instead of being shrunk to imgsz whole.
+
+    Frames are decoded on a background thread; batches are letterboxed by
+    _TensorFeeder and, on a GPU, uploaded one batch ahead of inference.
+    """
+    imgsz = -(-imgsz // 32) * 32  # tensor inputs must be a multiple of the model stride
+    device = torch.device("cuda", 0) if torch.cuda.is_available() else torch.device("cpu")
+    feeder = None
+    origins = None  # tile origins, when frames are tiled
+    # inputs per predict call; an engine takes no more than it was built for
+    per_call = min(batch_size, YOLOE_BATCH) if _engine else batch_size
+
+    def finish(frames, detect, todo, source):
+        # Predict calls of up to per_call inputs (frames or tiles); the tracker
+        # then walks the results in frame order
+        source = feeder.ready(source) if todo else None
+        results = iter([
+            r for i in range(0, len(source) if todo else 0, per_call)
+            for r in predict(model, source[i:i + per_call], imgsz=imgsz, conf=conf, verbose=verbose)
+        ])
+        for frame_bgr, d in zip(frames, detect):
+            # decoded frames are not reused, so they are pixelated in place
+            if d and origins is not None:
+                yield _pixelate_tiled(frame_bgr, [next(results) for _ in origins], origins, tracker,
+                                      pixel_size=pixel_size, box_map=feeder.unletterbox)
+            elif d:
+                yield _pixelate_tracked(frame_bgr, next(results), tracker,
+                                        pixel_size=pixel_size, box_map=feeder.unletterbox)
+            else:
+                H, W = frame_bgr.shape[:2]
+                yield _render_tracks(frame_bgr, tracker.step_no_detections((W, H)), pixel_size=pixel_size)
+
+    frame_idx = 0
+    prev_gray = None
+    pending = None
+    # frames are decoded on a background thread, up to two batches ahead
+    for frames in _threaded(_read_batches(cap, batch_size), maxsize=2):
+        if feeder is None:
+            H, W = frames[0].shape[:2]
+            if tile and W * H > TILE_MIN_PIXELS:
+                tile_size, origins = _tile_origins((W, H))
+                feeder = _TensorFeeder(tile_size, imgsz, batch_size * len(origins), device)
+            else:
+                feeder = _TensorFeeder((W, H), imgsz, batch_size, device)
+
+        # Pick the frames that get a detection pass
+        detect = []
+        for frame_bgr in frames:
+            gray = _thumb_gray(frame_bgr)
+            changed = prev_gray is not None and cv2.absdiff(prev_gray, gray).mean() > scene_diff_thresh
+            detect.append(frame_idx % detect_every == 0 or changed)
+            prev_gray = gray
+            frame_idx += 1
+
+        todo = [f for f, d in zip(frames, detect) if d]
+        if origins is not None:
+            tw, th = feeder.frame_w, feeder.frame_h
+            todo = [f[y:y + th, x:x + tw] for f in todo for x, y in origins]
+        source = feeder.upload(todo) if todo else None
+        # this batch is in flight; run the previous one meanwhile
+        if pending is not None:
+            yield from finish(*pending)
+        pending = (frames, detect, todo, source)
+    if pending is not None:
+        yield from finish(*pending)
+
+def _ffmpeg_exe() -> str:
+    """ffmpeg on PATH, else the binary bundled with imageio-ffmpeg (installed with moviepy)"""
+    exe = shutil.which("ffmpeg")
+    if exe is not None:
+        return exe
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+@functools.lru_cache(maxsize=1)
+def _h264_encoder() -> List[str]:
+    """ffmpeg video codec args: h264_nvenc if it can encode here, else libx264"""
+    probe = [
+        _ffmpeg_exe(), "-loglevel", "error",
+        "-f", "lavfi", "-i", "color=size=256x256:duration=0.1",
+        "-c:v", "h264_nvenc", "-f", "null", "-",
+    ]
+    try:
+        if subprocess.run(probe, capture_output=True, timeout=30).returncode == 0:
+            return ["-c:v", "h264_nvenc", "-preset", "p3"]
+    except Exception:
+        pass
+    return ["-c:v", "libx264", "-preset", "veryfast"]
+
+# Audio codecs that can be stream-copied into the .mp4 output as-is
+MP4_AUDIO_CODECS = {"aac", "mp3", "alac"}
+
+def _audio_codec_args(audio_src: Path) -> List[str]:
+    """Copy the source's audio when MP4 can hold it (probed with PyAV), else re-encode to AAC"""
+    if AV_AVAILABLE:
+        try:
+            with av.open(str(audio_src)) as container:
+                audio = container.streams.audio
+                if audio and audio[0].codec_context.name in MP4_AUDIO_CODECS:
+                    return ["-c:a", "copy"]
+        except Exception:
+            pass
+    return ["-c:a", "aac"]
+
+class FfmpegPipeWriter:
+    """
+    Streams raw BGR frames into one ffmpeg process that encodes H.264 and muxes
+    the audio track (if any) of `audio_src` in the same pass.
+    Same write/release interface as cv2.VideoWriter.
+    """
+    def __init__(self, out_path: Path, fps: float, size: Tuple[int, int], audio_src: Optional[Path] = None):
+        W, H = size
+        cmd = [
+            _ffmpeg_exe(), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{W}x{H}", "-r", str(fps), "-i", "-",
+        ]
+        if audio_src is not None:
+            cmd += ["-i", str(audio_src), "-map", "0:v:0", "-map", "1:a:0?", *_audio_codec_args(audio_src), "-shortest"]
+        cmd += _h264_encoder() + ["-pix_fmt", "yuv420p", str(out_path)]
+        self.out_path = Path(out_path)
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, frame_bgr: np.ndarray) -> None:
+        self.proc.stdin.write(np.ascontiguousarray(frame_bgr).data)
+
+    def release(self) -> None:
+        self.proc.stdin.close()
+        if self.proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {self.proc.returncode}")
+
+    def abort(self) -> None:
+        """Kill ffmpeg and remove the partial output; safe to call after release()"""
+        if self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+        with contextlib.suppress(OSError):
+            self.proc.stdin.close()
+        self.out_path.unlink(missing_ok=True)
+
 def run_video_censor(
     model,
     in_video_path: str = "/backend/data/HD_car_vid.mp4",
@@ -297,13 +1256,21 @@ def run_video_censor(
     imgsz: int = 640,
     conf: float = 0.25,
     pixel_size: int = 14,
-    verbose: bool = False
+    verbose: bool = False,
+    batch_size: int = YOLOE_BATCH,
+    detect_every: int = 3,            # run YOLOE on every N-th frame ...
+    scene_diff_thresh: float = 12.0,  # ... or when the frame changes this much (mean abs diff, 0-255)
+    tile: bool = True,                # detect frames over TILE_MIN_PIXELS as tiles
 ) -> None:
     """
     1) Read MP4 from /backend/data/HD_car_vid.mp4 (by default)
     2) Extract original audio
     3) For each frame, run YOLOE and pixelate detected regions (no per-frame saves)
     4) Write processed video to /backend/data/HD_car_vid_pixelated.mp4 with original audio
+
+    `batch_size` frames are decoded, detected (one predict call) and encoded at
+    a time: larger batches keep the GPU busier, but take more GPU memory and
+    keep more frames in flight (a few batches between decoder and encoder).
     """
     tracker = BoxTracker(
         alpha=0.5,             # 0.3–0.6 typical
@@ -318,64 +1285,38 @@ def run_video_censor(
     out_path = Path(out_video_path)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    clip = VideoFileClip(str(in_path))
-    fps = clip.fps
-    width, height = clip.size  # (w, h)
-    audio = clip.audio  # may be None
+    cap = open_video_capture(str(in_path))
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Could not open video at {in_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")  # widely compatible; 'avc1' may also work
-    tmp_silent_path = out_path.with_suffix(".video_silent.mp4")
-    writer = cv2.VideoWriter(str(tmp_silent_path), fourcc, fps, (width, height))
-    if not writer.isOpened():
-        clip.close()
-        raise RuntimeError("Failed to open VideoWriter for output video stream.")
-
-    # Iterate frames in RGB from moviepy, convert to BGR for OpenCV and model
-    frame_num = int(clip.duration * fps)
-    frame_count = 0
-    print(f"Processing {frame_num} frames at {fps} FPS, resolution {width}x{height}")
-    for frame_rgb in clip.iter_frames(fps=fps, dtype="uint8"):
-        frame_count += 1
-        if frame_count % 50 == 0 or frame_count == frame_num:
-            print(f"  Processing frame {frame_count}/{frame_num}...")
-        frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
-
-        processed_bgr, _ = _pixelate_frame_with_yoloe(
-            model,
-            frame_bgr,
-            tracker,
-            imgsz=imgsz,
-            conf=conf,
-            verbose=verbose,
-            pixel_size=pixel_size,
-        )
-
-        writer.write(processed_bgr)
-
-    writer.release()
-
-    # Mux original audio back
-    processed_clip = VideoFileClip(str(tmp_silent_path))
-    if audio is not None:
-        processed_clip = processed_clip.set_audio(audio)
-
-    processed_clip.write_videofile(
-        str(out_path),
-        codec="libx264",
-        audio_codec="aac" if audio is not None else None,
-        fps=fps,
-        threads=4,
-        verbose=False,
-        logger=None
-    )
-    processed_clip.close()
-    clip.close()
-
-    # Clean up temp file
     try:
-        Path(tmp_silent_path).unlink()
-    except Exception:
-        pass
+        # Frames go straight to the final H.264 file, with the original audio muxed in;
+        # encoding runs on a background thread
+        writer = ThreadedWriter(FfmpegPipeWriter(out_path, fps, (width, height), audio_src=in_path),
+                                maxsize=2 * batch_size)
+
+        # Frames are decoded straight to BGR, which is what the model and writer take
+        frame_num = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))  # 0: unknown
+        frame_count = 0
+        print(f"Processing {frame_num or 'unknown number of'} frames at {fps} FPS, resolution {width}x{height}")
+        try:
+            for processed_bgr, _ in _censor_frames(
+                model, cap, tracker, imgsz, conf, verbose, pixel_size, batch_size, detect_every, scene_diff_thresh, tile
+            ):
+                frame_count += 1
+                if frame_count % 50 == 0 or frame_count == frame_num:
+                    print(f"  Processing frame {frame_count}/{frame_num or '?'}...")
+                writer.write(processed_bgr)
+            writer.release()
+        except BaseException:
+            # No ffmpeg process or half-written file left behind
+            writer.abort()
+            raise
+    finally:
+        cap.release()
 
 def run_video_censor_send_bboxes(
     model,
@@ -383,7 +1324,11 @@ def run_video_censor_send_bboxes(
     imgsz: int = 640,
     conf: float = 0.25,
     pixel_size: int = 14,
-    verbose: bool = False
+    verbose: bool = False,
+    batch_size: int = YOLOE_BATCH,
+    detect_every: int = 3,            # run YOLOE on every N-th frame ...
+    scene_diff_thresh: float = 12.0,  # ... or when the frame changes this much (mean abs diff, 0-255)
+    tile: bool = True,                # detect frames over TILE_MIN_PIXELS as tiles
 ) -> List[Dict[str, List[Tuple[int, int, int, int]]]]:
     """
     1) Read MP4 from /backend/data/HD_car_vid.mp4 (by default)
@@ -403,31 +1348,27 @@ def run_video_censor_send_bboxes(
         
     in_path = Path(in_video_path)
 
-    clip = VideoFileClip(str(in_path))
-    fps = clip.fps
-    width, height = clip.size  # (w, h)
+    cap = open_video_capture(str(in_path))
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Could not open video at {in_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-    # Iterate frames in RGB from moviepy, convert to BGR for OpenCV and model
-    frame_num = int(clip.duration * fps)
+    # Frames are decoded straight to BGR, which is what the model takes
+    frame_num = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))  # 0: unknown
     frame_count = 0
-    print(f"Processing {frame_num} frames at {fps} FPS, resolution {width}x{height}")
-    for frame_rgb in clip.iter_frames(fps=fps, dtype="uint8"):
-        frame_count += 1
-        if frame_count % 50 == 0 or frame_count == frame_num:
-            print(f"  Processing frame {frame_count}/{frame_num}...")
-        frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
-
-        _, active_detection_dict = _pixelate_frame_with_yoloe(
-            model,
-            frame_bgr,
-            tracker,
-            imgsz=imgsz,
-            conf=conf,
-            verbose=verbose,
-            pixel_size=pixel_size,
-        )
-        active_detection_dict_list.append(active_detection_dict)
-        
+    print(f"Processing {frame_num or 'unknown number of'} frames at {fps} FPS, resolution {width}x{height}")
+    try:
+        for _, active_detection_dict in _censor_frames(
+            model, cap, tracker, imgsz, conf, verbose, pixel_size, batch_size, detect_every, scene_diff_thresh, tile
+        ):
+            frame_count += 1
+            if frame_count % 50 == 0 or frame_count == frame_num:
+                print(f"  Processing frame {frame_count}/{frame_num or '?'}...")
+            active_detection_dict_list.append(active_detection_dict)
+    finally:
+        cap.release()
     return active_detection_dict_list
         
 def main():
@@ -1,17 +1,23 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Depends, Request
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, BackgroundTasks, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
+import asyncio
+import functools
+import gc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import os
-import uuid
-import tempfile
+import queue
+import re
+import secrets
 import shutil
 from pathlib import Path
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import sys
 import time
-from collections import defaultdict
-from datetime import datetime, timedelta
 
 # Add the backend directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -20,6 +26,27 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+import censor_worker
+
+# This process, for memory logging and /status; None without psutil
+try:
+    import psutil
+    _PROC = psutil.Process()
+except ImportError:
+    _PROC = None
+
+# YOLOE runs in this many worker processes; /process awaits them so the event
+# loop stays free during an encode. Each worker holds its own model, so the
+# default is 1 (also what a single GPU wants); "auto" uses half the CPUs, for
+# CPU inference on hosts with the memory for it
+_workers = os.getenv("PROCESS_WORKERS", "1")
+PROCESS_WORKERS = max(1, (os.cpu_count() or 2) // 2) if _workers == "auto" else int(_workers)
+process_pool: Optional[ProcessPoolExecutor] = None
+# One slot per worker: jobs beyond that wait here, where a dropped request
+# cancels them, rather than in the pool's call queue
+worker_slots: Optional[asyncio.Semaphore] = None
+model_ready = False
+
 # Import Supabase integration (optional)
 try:
     from auth_middleware import get_current_user_optional
@@ -64,9 +91,9 @@ async def startup_event():
             # Test Supabase connection with timeout
             supabase_config.test_connection()
             logger.info("Supabase connection test successful")
+            supabase_config.warm()
             
             # Initialize storage bucket in background (non-blocking)
-            import asyncio
             asyncio.create_task(initialize_storage_bucket())
             
         except Exception as e:
@@ -74,9 +101,72 @@ async def startup_event():
             logger.warning("Continuing without Supabase integration")
             SUPABASE_AVAILABLE = False
     
-    # Load YOLO model after startup (non-blocking)
-    import asyncio
-    asyncio.create_task(load_model_after_startup())
+    # Start the worker pool ("spawn": CUDA cannot be used in forked children) and
+    # load the YOLO model in it after startup (non-blocking)
+    global worker_slots
+    worker_slots = asyncio.Semaphore(PROCESS_WORKERS)
+    _start_process_pool()
+    # Kept on app.state so the task is not garbage-collected, and is cancelled on shutdown
+    app.state.rate_limit_sweeper = asyncio.create_task(_sweep_rate_limits())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    sweeper = getattr(app.state, "rate_limit_sweeper", None)
+    if sweeper is not None:
+        sweeper.cancel()
+        try:
+            await sweeper
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Rate limit sweeper failed: {str(e)}")
+    if process_pool is not None:
+        process_pool.shutdown(wait=False, cancel_futures=True)
+    if SUPABASE_AVAILABLE:
+        supabase_config.close()
+
+def _start_process_pool():
+    """
+    Start a new worker pool and load the YOLO model in it in the background;
+    model_ready is set once every worker has loaded it
+    """
+    global process_pool, model_ready
+    model_ready = False
+    process_pool = ProcessPoolExecutor(
+        max_workers=PROCESS_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=censor_worker.init_worker,
+    )
+    # Kept on app.state so the task is not garbage-collected
+    app.state.model_loader = asyncio.create_task(load_model_after_startup(process_pool))
+
+def _restart_process_pool(broken: ProcessPoolExecutor):
+    """Replace `broken` (once: concurrent failures of the same pool share the restart)"""
+    if process_pool is not broken:
+        return
+    logger.error("❌ A worker process died; restarting the worker pool")
+    loader = getattr(app.state, "model_loader", None)
+    if loader is not None:
+        loader.cancel()
+    broken.shutdown(wait=False, cancel_futures=True)
+    _start_process_pool()
+
+async def _run_in_pool(pool, fn, *args):
+    async with worker_slots:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+async def run_in_worker(fn, *args):
+    """
+    Run `fn(*args)` in the YOLOE worker pool without blocking the event loop.
+    A worker that dies (CUDA OOM, native crash) breaks the whole pool: it is
+    restarted and this request gets a 503.
+    """
+    pool = process_pool
+    try:
+        return await _run_in_pool(pool, fn, *args)
+    except BrokenProcessPool:
+        _restart_process_pool(pool)
+        raise HTTPException(status_code=503, detail="Processing workers are restarting, please try again shortly")
 
 async def initialize_storage_bucket():
     """Initialize storage bucket in background"""
@@ -87,38 +177,73 @@ async def initialize_storage_bucket():
         logger.warning(f"Storage bucket initialization failed: {str(e)}")
         logger.warning("Storage features may not work properly")
 
-async def load_model_after_startup():
-    """Load YOLO model after startup to avoid blocking port binding"""
+async def load_model_after_startup(pool: ProcessPoolExecutor):
+    """Load YOLO model in the worker pool after startup to avoid blocking port binding"""
+    global model_ready
     try:
         logger.info("🤖 Loading YOLO model in background...")
+        start = time.time()
         
-        # Import memory optimization modules
-        import gc
-        import psutil
-        
-        # Log initial memory usage
-        process = psutil.Process()
-        initial_memory = process.memory_info().rss / 1024 / 1024  # MB
-        logger.info(f"📊 Initial memory usage: {initial_memory:.1f} MB")
-        
-        from scripts.yolo_e import get_model
-        model = get_model()
-        
-        # Log memory usage after model loading
-        post_model_memory = process.memory_info().rss / 1024 / 1024  # MB
-        logger.info(f"📊 Memory after model load: {post_model_memory:.1f} MB (+{post_model_memory - initial_memory:.1f} MB)")
-        
-        # Force garbage collection
-        gc.collect()
-        
-        final_memory = process.memory_info().rss / 1024 / 1024  # MB
-        logger.info(f"📊 Memory after cleanup: {final_memory:.1f} MB")
+        # Ping until every worker has answered: a worker only takes jobs once
+        # init_worker is done, but a ready one can answer several pings
+        ready = set()
+        while len(ready) < PROCESS_WORKERS:
+            pids = await asyncio.gather(*(_run_in_pool(pool, censor_worker.ping) for _ in range(PROCESS_WORKERS)))
+            if ready.issuperset(pids):
+                await asyncio.sleep(0.5)
+            ready.update(pids)
+        model_ready = True
         
-        logger.info("✅ YOLO model loaded successfully!")
+        logger.info(f"✅ YOLO model loaded successfully in {PROCESS_WORKERS} worker(s) ({time.time() - start:.1f}s)")
     except Exception as e:
         logger.error(f"❌ Failed to load YOLO model: {str(e)}")
         logger.warning("File processing will fail until model is loaded")
 
+# Upload size cap (reduced to 25MB for memory constraints), and the request body
+# cap for /process derived from it (room for the multipart framing and fields)
+MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB in bytes (reduced from 50MB)
+MAX_PROCESS_BODY = MAX_FILE_SIZE + 64 * 1024
+
+class ProcessBodyLimitMiddleware:
+    """
+    Rejects /process request bodies over MAX_PROCESS_BODY with 413 while they
+    arrive. Starlette spools the whole multipart upload before the handler
+    runs, so the handler's own size checks come after the memory / disk is
+    spent. Checks Content-Length up front and counts the bytes of bodies
+    sent without one.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != "/process":
+            return await self.app(scope, receive, send)
+        
+        too_large = HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size allowed is {MAX_FILE_SIZE // (1024 * 1024)}MB"
+        )
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > MAX_PROCESS_BODY:
+            response = JSONResponse(status_code=too_large.status_code, content={"detail": too_large.detail})
+            return await response(scope, receive, send)
+        
+        received = 0
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > MAX_PROCESS_BODY:
+                    # raised inside body parsing, which FastAPI re-raises as-is
+                    raise too_large
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+# Registered before CORS, so CORS wraps it and its 413s carry CORS headers
+app.add_middleware(ProcessBodyLimitMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -132,87 +257,307 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create upload directory (outputs now handled by Supabase Storage)
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Scratch space for uploads and video outputs, which only live for one request
+# (outputs now handled by Supabase Storage): PIIPAL_SCRATCH if set, else tmpfs
+# (/dev/shm) so they never reach the disk, if it has room for a few uploads
+# (container /dev/shm is often only 64MB), else uploads/ on disk. Requests are
+# refused while it has less than SCRATCH_MIN_FREE left.
+SCRATCH_MIN_FREE = 2 * MAX_FILE_SIZE
+
+def _scratch_dir() -> Path:
+    if os.environ.get("PIIPAL_SCRATCH"):
+        return Path(os.environ["PIIPAL_SCRATCH"])
+    shm = Path("/dev/shm")
+    try:
+        if os.access(shm, os.W_OK) and shutil.disk_usage(shm).free >= 4 * MAX_FILE_SIZE:
+            return shm / "piipal"
+    except OSError:
+        pass
+    return Path("uploads")
+
+UPLOAD_DIR = _scratch_dir()
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+logger.info(f"Scratch directory for uploads: {UPLOAD_DIR}")
 
-# Rate limiting storage
-rate_limit_storage = defaultdict(list)
+# Rate limiting storage (sliding window counter): per IP, (requests in the
+# previous window, requests in the current window, current window number);
+# IPs idle for two windows are dropped by _sweep_rate_limits
+rate_limit_storage: Dict[str, Tuple[int, int, int]] = {}
 RATE_LIMIT_REQUESTS = 10  # Max requests per minute per IP
 RATE_LIMIT_WINDOW = 60  # Time window in seconds
 
 # Supported file types
-SUPPORTED_VIDEO_TYPES = {".mp4", ".avi", ".mov", ".mkv", ".webm", ".MP4", ".AVI", ".MOV", ".MKV", ".WEBM"}
-SUPPORTED_IMAGE_TYPES = {".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".JPG", ".JPEG", ".PNG", ".BMP", ".TIFF"}
+# (lowercase: suffixes are lowercased before lookup)
+SUPPORTED_VIDEO_TYPES = {".mp4", ".avi", ".mov", ".mkv", ".webm"}
+SUPPORTED_IMAGE_TYPES = {".jpg", ".jpeg", ".png", ".bmp", ".tiff"}
+# Characters replaced with "_" in uploaded filenames; ASCII names (the usual
+# case) go through the equivalent bytes.translate table instead of the regex
+_FILENAME_UNSAFE = re.compile(r'[^\w\-_\.]')
+_FILENAME_ASCII_TABLE = bytes(ord('_') if _FILENAME_UNSAFE.match(chr(c)) else c for c in range(256))
+# Suffix -> "video" / "image"
+_FILE_KINDS = {**{s: "video" for s in SUPPORTED_VIDEO_TYPES}, **{s: "image" for s in SUPPORTED_IMAGE_TYPES}}
+
+# Chunk size when spooling uploads to disk (memory per upload stays at one chunk)
+UPLOAD_COPY_BUFFER = 4 * 1024 * 1024
+# Copy buffers are reused across uploads: allocated on demand, and up to this
+# many kept between requests (a fixed pool of 4 MiB buffers would not fit the
+# memory budget)
+UPLOAD_BUFFER_POOL_SIZE = 4
+_upload_buffers: "queue.LifoQueue[bytearray]" = queue.LifoQueue(maxsize=UPLOAD_BUFFER_POOL_SIZE)
+
+# Leading bytes of each upload kept for the file signature check
+UPLOAD_HEADER_BYTES = 16
+# File signatures accepted per content type prefix
+_FILE_SIGNATURES = {
+    "image/": (
+        b'\xFF\xD8\xFF',  # JPEG
+        b'\x89PNG\r\n\x1a\n',  # PNG
+        b'BM',  # BMP
+        b'GIF87a', b'GIF89a',  # GIF
+    ),
+    "video/": (
+        b'\x00\x00\x00',  # MP4/MOV
+        b'RIFF',  # AVI/WEBM
+    ),
+}
+
+# Videos: upper bound for the /process `stride` (run detection on every N-th frame)
+MAX_DETECT_STRIDE = 10
+# Videos: upper bound for the /process `batch` (frames per YOLOE predict call)
+MAX_VIDEO_BATCH = 32
+
+# /process with defer_upload: storage uploads that run after the response,
+# by job id (the upload's file id); polled via /jobs/{job_id}, kept this long (s)
+UPLOAD_JOB_TTL = 3600
+# defer_upload when the form does not say: PROCESS_DEFER_UPLOAD=1 makes the
+# background upload the default (clients must then poll /jobs/{job_id})
+DEFER_UPLOAD_DEFAULT = os.getenv("PROCESS_DEFER_UPLOAD", "0") == "1"
+upload_jobs: Dict[str, Dict[str, Any]] = {}
+
+def file_kind(filename: str) -> Optional[str]:
+    """"video" or "image" based on extension; None if unsupported"""
+    return _FILE_KINDS.get(os.path.splitext(filename)[1].lower())
 
 def is_video_file(filename: str) -> bool:
     """Check if file is a video based on extension"""
-    return Path(filename).suffix.lower() in SUPPORTED_VIDEO_TYPES
+    return file_kind(filename) == "video"
 
 def is_image_file(filename: str) -> bool:
     """Check if file is an image based on extension"""
-    return Path(filename).suffix.lower() in SUPPORTED_IMAGE_TYPES
+    return file_kind(filename) == "image"
 
 def _check_rate_limit(client_ip: str) -> bool:
     """Check if client has exceeded rate limit"""
-    now = datetime.now()
-    # Clean old entries
-    rate_limit_storage[client_ip] = [
-        req_time for req_time in rate_limit_storage[client_ip]
-        if now - req_time < timedelta(seconds=RATE_LIMIT_WINDOW)
-    ]
-    
-    # Check if limit exceeded
-    if len(rate_limit_storage[client_ip]) >= RATE_LIMIT_REQUESTS:
+    now = time.monotonic()
+    window = int(now // RATE_LIMIT_WINDOW)
+    prev, curr, stored_window = rate_limit_storage.get(client_ip, (0, 0, window))
+    # Roll the counters forward to the current window
+    if stored_window == window - 1:
+        prev, curr = curr, 0
+    elif stored_window != window:
+        prev, curr = 0, 0
+    
+    # Check if limit exceeded: the previous window counts for the part of it
+    # still inside the last RATE_LIMIT_WINDOW seconds
+    elapsed = (now % RATE_LIMIT_WINDOW) / RATE_LIMIT_WINDOW
+    if curr + prev * (1 - elapsed) >= RATE_LIMIT_REQUESTS:
+        rate_limit_storage[client_ip] = (prev, curr, window)
         return False
     
     # Add current request
-    rate_limit_storage[client_ip].append(now)
+    rate_limit_storage[client_ip] = (prev, curr + 1, window)
     return True
 
-def _validate_file_content(file_path: Path, content_type: str) -> bool:
-    """Basic file content validation to prevent malicious uploads"""
+async def _sweep_rate_limits():
+    """Every RATE_LIMIT_WINDOW, forget IPs whose counters no longer affect the limit"""
+    while True:
+        await asyncio.sleep(RATE_LIMIT_WINDOW)
+        try:
+            window = int(time.monotonic() // RATE_LIMIT_WINDOW)
+            for ip in [ip for ip, (_, _, w) in rate_limit_storage.items() if w < window - 1]:
+                del rate_limit_storage[ip]
+        except Exception as e:
+            logger.error(f"Error sweeping rate limit storage: {str(e)}")
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. Maximum size allowed is {max_bytes // (1024 * 1024)}MB"
+    )
+
+def _save_upload(src, dest: Path, max_bytes: int) -> bytes:
+    """
+    Copy the upload stream `src` to `dest` in UPLOAD_COPY_BUFFER chunks; raises
+    413 as soon as more than `max_bytes` arrived, without reading the rest.
+    Blocking: run it in the threadpool. Returns the first UPLOAD_HEADER_BYTES
+    bytes, for _validate_file_content.
+    """
+    # Uploads over the spool threshold are already in a temporary file: check its
+    # size up front and let the kernel copy it (sendfile), with no userspace buffer
+    if getattr(src, "_rolled", False) and hasattr(os, "sendfile"):
+        in_fd = src.fileno()
+        size = os.fstat(in_fd).st_size
+        if size > max_bytes:
+            raise _too_large(max_bytes)
+        written = 0
+        with open(dest, "wb") as out:
+            while written < size and (n := os.sendfile(out.fileno(), in_fd, written, size - written)):
+                written += n
+        return os.pread(in_fd, UPLOAD_HEADER_BYTES, 0)
+    
     try:
-        # Check file size (should already be validated, but double-check)
-        if file_path.stat().st_size == 0:
-            return False
-        
-        # Read first few bytes to check file signatures
-        with open(file_path, 'rb') as f:
-            header = f.read(16)
-        
-        # Check for common file signatures
-        if content_type.startswith('image/'):
-            # Check for image file signatures
-            if header.startswith(b'\xFF\xD8\xFF'):  # JPEG
-                return True
-            elif header.startswith(b'\x89PNG\r\n\x1a\n'):  # PNG
-                return True
-            elif header.startswith(b'BM'):  # BMP
-                return True
-            elif header.startswith(b'GIF87a') or header.startswith(b'GIF89a'):  # GIF
-                return True
-            else:
-                logger.warning(f"Unknown image format for file: {file_path}")
-                return False
-                
-        elif content_type.startswith('video/'):
-            # Check for video file signatures
-            if header.startswith(b'\x00\x00\x00'):  # MP4/MOV
-                return True
-            elif header.startswith(b'RIFF'):  # AVI/WEBM
-                return True
-            else:
-                logger.warning(f"Unknown video format for file: {file_path}")
-                return False
-        
-        # If we can't validate, be conservative and reject
-        logger.warning(f"Could not validate file content for: {file_path}")
+        buf = _upload_buffers.get_nowait()
+    except queue.Empty:
+        buf = bytearray(UPLOAD_COPY_BUFFER)
+    view = memoryview(buf)
+    written = 0
+    header = b""
+    try:
+        with open(dest, "wb") as out:
+            # readinto: chunks land in the pooled buffer instead of a new bytes object each
+            while n := src.readinto(view):
+                written += n
+                if written > max_bytes:
+                    raise _too_large(max_bytes)
+                if len(header) < UPLOAD_HEADER_BYTES:
+                    header += view[:min(n, UPLOAD_HEADER_BYTES - len(header))]
+                out.write(view[:n])
+    finally:
+        view.release()
+        try:
+            _upload_buffers.put_nowait(buf)
+        except queue.Full:
+            pass
+    return header
+
+# Per-user storage listings are reused for USER_FILES_TTL seconds (a dashboard
+# hits /files, /user/files and /user/stats together); dropped when the user's
+# files change. For USER_FILES_STALE seconds after that, the old listing is
+# still served while a refresh runs in the background
+USER_FILES_TTL = 10
+USER_FILES_STALE = 60
+_user_files_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+# In-flight listing per user, shared by concurrent requests
+_user_files_fetches: Dict[str, "asyncio.Task[List[Dict[str, Any]]]"] = {}
+
+async def _list_user_files(user_id: str) -> List[Dict[str, Any]]:
+    """storage_service.list_user_files, cached per user (see USER_FILES_TTL)"""
+    cached = _user_files_cache.get(user_id)
+    if cached:
+        age = time.monotonic() - cached[0]
+        if age < USER_FILES_TTL:
+            return cached[1]
+        if age < USER_FILES_TTL + USER_FILES_STALE:
+            _fetch_user_files(user_id)
+            return cached[1]
+    try:
+        # Shielded: a dropped request must not cancel a listing others are waiting on
+        return await asyncio.shield(_fetch_user_files(user_id))
+    except Exception:
+        # Logged by _user_files_fetch_done; as storage_service.list_user_files does
+        return []
+
+def _fetch_user_files(user_id: str) -> "asyncio.Task[List[Dict[str, Any]]]":
+    """The in-flight listing for `user_id`, started if there is none"""
+    task = _user_files_fetches.get(user_id)
+    if task is None:
+        task = _user_files_fetches[user_id] = asyncio.create_task(_refresh_user_files(user_id))
+        task.add_done_callback(functools.partial(_user_files_fetch_done, user_id))
+    return task
+
+async def _refresh_user_files(user_id: str) -> List[Dict[str, Any]]:
+    """List the user's files into the cache, unless invalidated meanwhile; raises on storage errors"""
+    this_fetch = asyncio.current_task()
+    files = await storage_service.fetch_user_files(user_id)
+    if _user_files_fetches.get(user_id) is this_fetch:
+        now = time.monotonic()
+        # Drop listings too old to serve, so the cache stays small
+        for uid in [u for u, (t, _) in _user_files_cache.items() if now - t >= USER_FILES_TTL + USER_FILES_STALE]:
+            del _user_files_cache[uid]
+        _user_files_cache[user_id] = (now, files)
+    return files
+
+def _user_files_fetch_done(user_id: str, task: "asyncio.Task[List[Dict[str, Any]]]") -> None:
+    """Done-callback of a listing fetch: no longer in flight; failures are logged (and not cached)"""
+    if _user_files_fetches.get(user_id) is task:
+        del _user_files_fetches[user_id]
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Error listing files for user {user_id}: {str(task.exception())}")
+
+def _invalidate_user_files(user_id: str) -> None:
+    _user_files_cache.pop(user_id, None)
+    # A listing already in flight may predate the change: don't let it be cached
+    _user_files_fetches.pop(user_id, None)
+
+def _unlink_if_present(path: Optional[Path]) -> bool:
+    """Remove `path` if given and present, in one syscall (no exists() first); whether it was removed"""
+    if path is None:
         return False
-        
+    try:
+        path.unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+def _prune_upload_jobs() -> None:
+    """Forget upload jobs older than UPLOAD_JOB_TTL"""
+    cutoff = time.time() - UPLOAD_JOB_TTL
+    for job_id in [j for j, job in upload_jobs.items() if job["created_at"] < cutoff]:
+        del upload_jobs[job_id]
+
+async def _upload_and_cleanup(
+    job_id: str,
+    user_id: str,
+    file_type: str,
+    output_filename: str,
+    output_path: Optional[Path] = None,
+    output_bytes: Optional[bytes] = None,
+) -> None:
+    """Background task for a deferred /process upload: store the output, record the result in upload_jobs"""
+    job = upload_jobs[job_id]
+    try:
+        if output_bytes is not None:
+            storage_info = await storage_service.upload_bytes(output_bytes, output_filename, user_id, file_type)
+        else:
+            storage_info = await storage_service.upload_file(output_path, user_id, file_type)
+        if storage_info and storage_info.get("public_url"):
+            job.update(
+                status="done",
+                output_file=storage_info["filename"],
+                download_url=storage_info["public_url"],
+                storage_url=storage_info["public_url"],
+            )
+            _invalidate_user_files(user_id)
+            logger.info(f"Successfully uploaded file to Supabase Storage for user {user_id}")
+        else:
+            job.update(status="failed", error="Failed to upload file to Supabase Storage")
     except Exception as e:
-        logger.error(f"Error validating file content: {e}")
+        logger.error(f"Failed to upload to Supabase Storage: {str(e)}")
+        job.update(status="failed", error=f"Storage upload failed: {str(e)}")
+    finally:
+        if _unlink_if_present(output_path):
+            logger.info(f"Cleaned up local file: {output_path}")
+
+def _validate_file_content(header: bytes, content_type: str) -> bool:
+    """
+    Basic file content validation to prevent malicious uploads: `header` (the
+    upload's first bytes, from _save_upload) must carry a known signature for
+    `content_type`
+    """
+    # Empty file (size should already be validated, but double-check)
+    if not header:
         return False
+    
+    for prefix, signatures in _FILE_SIGNATURES.items():
+        if content_type.startswith(prefix):
+            if header.startswith(signatures):
+                return True
+            logger.warning(f"Unknown {prefix.rstrip('/')} format for upload ({content_type})")
+            return False
+    
+    # If we can't validate, be conservative and reject
+    logger.warning(f"Could not validate file content for upload ({content_type})")
+    return False
 
 @app.get("/")
 async def root():
@@ -237,27 +582,18 @@ async def ready_check():
 async def status_check():
     """Comprehensive status check for monitoring"""
     try:
-        # Check if YOLO model is loaded
-        model_loaded = False
-        try:
-            from scripts.yolo_e import _model
-            model_loaded = _model is not None
-        except ImportError as e:
-            logger.warning(f"Could not import YOLO model for status check: {e}")
-        except Exception as e:
-            logger.warning(f"Error checking model status: {e}")
+        # Check if YOLO model is loaded (in the worker pool)
+        model_loaded = model_ready
         
         # Get memory usage
-        memory_info = {}
-        try:
-            import psutil
-            process = psutil.Process()
+        if _PROC:
             memory_info = {
-                "memory_mb": round(process.memory_info().rss / 1024 / 1024, 1),
-                "memory_percent": round(process.memory_percent(), 1),
-                "cpu_percent": round(process.cpu_percent(), 1)
+                "memory_mb": round(_PROC.memory_info().rss / 1024 / 1024, 1),
+                "memory_percent": round(_PROC.memory_percent(), 1),
+                # Since the previous /status call (the handle is kept between calls)
+                "cpu_percent": round(_PROC.cpu_percent(), 1)
             }
-        except ImportError:
+        else:
             memory_info = {"error": "psutil not available"}
         
         return {
@@ -286,6 +622,9 @@ async def ping():
 async def process_file_endpoint(
     request: Request,
     file: UploadFile = File(...),
+    stride: int = Form(3),
+    batch: Optional[int] = Form(None),
+    defer_upload: Optional[bool] = Form(None),
     background_tasks: BackgroundTasks = None,
     current_user: Optional[Dict[str, Any]] = Depends(get_current_user_optional)
 ):
@@ -294,7 +633,16 @@ async def process_file_endpoint(
     
     Automatically detects file type and applies appropriate processing:
     - Images: Uses run_image_pixelate() with YOLOE detection
-    - Videos: Uses run_video_censor() with YOLOE detection and frame-by-frame processing
+    - Videos: Uses run_video_censor() with YOLOE detection and frame-by-frame processing;
+      `batch` frames go through YOLOE per call (default YOLOE_BATCH; larger is
+      faster on a GPU, up to its memory, but holds more frames in flight);
+      `stride` runs detection on every stride-th frame (1 = every frame), trading
+      quality for speed
+
+    With `defer_upload` (default: PROCESS_DEFER_UPLOAD), the response (202)
+    comes as soon as processing is done, with a `job_id`; the storage upload
+    runs in the background and GET /jobs/{job_id} reports its status and, once
+    done, the download URL.
     """
     # Rate limiting check
     client_ip = request.client.host
@@ -308,13 +656,32 @@ async def process_file_endpoint(
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
+    # "video" / "image", decided once from the extension
+    file_type = file_kind(file.filename)
+    if file_type is None:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Unsupported file type. Supported: {', '.join(SUPPORTED_VIDEO_TYPES | SUPPORTED_IMAGE_TYPES)}"
+        )
+    
+    if not 1 <= stride <= MAX_DETECT_STRIDE:
+        raise HTTPException(status_code=400, detail=f"stride must be between 1 and {MAX_DETECT_STRIDE}")
+    
+    if batch is not None and not 1 <= batch <= MAX_VIDEO_BATCH:
+        raise HTTPException(status_code=400, detail=f"batch must be between 1 and {MAX_VIDEO_BATCH}")
+    
+    if defer_upload is None:
+        defer_upload = DEFER_UPLOAD_DEFAULT
+    
     # Log file information for debugging
     logger.info(f"Processing file: {file.filename}")
-    logger.info(f"File size: {file.size} bytes ({file.size / (1024 * 1024):.2f} MB)")
+    if file.size is not None:
+        logger.info(f"File size: {file.size} bytes ({file.size / (1024 * 1024):.2f} MB)")
     logger.info(f"File content type: {file.content_type}")
     
-    # Check file size limit (reduced to 25MB for memory constraints)
-    MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB in bytes (reduced from 50MB)
+    # Check file size limit; the request body was already capped by
+    # ProcessBodyLimitMiddleware, and uploads without a known size are checked
+    # again while they are written to disk
     if file.size and file.size > MAX_FILE_SIZE:
         logger.warning(f"File too large: {file.size} bytes > {MAX_FILE_SIZE} bytes")
         raise HTTPException(
@@ -323,29 +690,42 @@ async def process_file_endpoint(
         )
     
     # Generate unique filename with security validation
-    file_id = str(uuid.uuid4())
+    # Also the job id and the storage path, so it must not be guessable: 128 bits
+    # from the OS CSPRNG
+    file_id = secrets.token_hex(16)
     
     # Sanitize filename to prevent path traversal attacks
-    import re
-    safe_filename = re.sub(r'[^\w\-_\.]', '_', file.filename)
+    if file.filename.isascii():
+        safe_filename = file.filename.encode('ascii').translate(_FILENAME_ASCII_TABLE).decode('ascii')
+    else:
+        safe_filename = _FILENAME_UNSAFE.sub('_', file.filename)
     safe_filename = safe_filename[:100]  # Limit filename length
     
     # Ensure filename doesn't contain path traversal attempts
     if '..' in safe_filename or '/' in safe_filename or '\\' in safe_filename:
         raise HTTPException(status_code=400, detail="Invalid filename - path traversal not allowed")
     
+    if shutil.disk_usage(UPLOAD_DIR).free < SCRATCH_MIN_FREE:
+        logger.warning(f"Scratch space low in {UPLOAD_DIR}, refusing upload")
+        raise HTTPException(status_code=503, detail="Server is busy, please try again shortly")
+    
     input_path = UPLOAD_DIR / f"{file_id}_{safe_filename}"
     # output_filename will be set later based on actual saved file
     output_filename = None
     output_path = None
+    output_bytes = None  # images: encoded output, kept in memory
+    output_size = 0  # videos: size of the file written to output_path
+    
+    # Save uploaded file off the event loop, in fixed-size chunks
+    try:
+        header = await run_in_threadpool(_save_upload, file.file, input_path, MAX_FILE_SIZE)
+    except Exception:
+        input_path.unlink(missing_ok=True)
+        raise
     
     try:
-        # Save uploaded file with content validation
-        with open(input_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
         # Basic file content validation
-        if not _validate_file_content(input_path, file.content_type):
+        if not _validate_file_content(header, file.content_type or ""):
             input_path.unlink()  # Remove the file
             raise HTTPException(status_code=400, detail="Invalid file content - file may be corrupted or malicious")
         
@@ -355,107 +735,49 @@ async def process_file_endpoint(
         start_time = time.time()
         
         # Log memory usage before processing
-        try:
-            import psutil
-            process = psutil.Process()
-            pre_processing_memory = process.memory_info().rss / 1024 / 1024  # MB
+        if _PROC and logger.isEnabledFor(logging.INFO):
+            pre_processing_memory = _PROC.memory_info().rss / 1024 / 1024  # MB
             logger.info(f"📊 Memory before processing: {pre_processing_memory:.1f} MB")
             
             # Check if we're approaching memory limit (400MB out of 512MB)
             if pre_processing_memory > 400:
                 logger.warning(f"⚠️ High memory usage detected: {pre_processing_memory:.1f} MB")
                 # Force garbage collection
-                import gc
                 gc.collect()
-                post_gc_memory = process.memory_info().rss / 1024 / 1024  # MB
+                post_gc_memory = _PROC.memory_info().rss / 1024 / 1024  # MB
                 logger.info(f"📊 Memory after cleanup: {post_gc_memory:.1f} MB")
-        except ImportError:
-            pass
         
         # Process based on file type
-        if is_video_file(file.filename):
+        if file_type == "video":
             logger.info(f"Processing as video: {file.filename}")
             
             # Set output filename for video
             output_filename = f"censored_{file_id}_{file.filename}"
             output_path = UPLOAD_DIR / output_filename
             
-            # Process video using yolo_e.py - import only when needed
-            from scripts.yolo_e import run_video_censor, get_model
-            model = get_model()  # Load model lazily
-            run_video_censor(
-                model=model,
-                in_video_path=str(input_path),
-                out_video_path=str(output_path),
-                imgsz=640,
-                conf=0.25,
-                pixel_size=14,
-                verbose=False
-            )
+            # Process video using yolo_e.py, in the worker pool
+            output_size = await run_in_worker(censor_worker.censor_video, str(input_path), str(output_path), stride, batch)
             
             message = "Video processed successfully"
             
-        elif is_image_file(file.filename):
+        else:
             logger.info(f"Processing as image: {file.filename}")
             
-            # Process image using yolo_e.py - import only when needed
-            from scripts.yolo_e import run_image_pixelate, get_model
-            model = get_model()  # Load model lazily
-            processed_img, detections = run_image_pixelate(
-                model=model,
-                img_path=str(input_path),
-                outdir=str(UPLOAD_DIR),
-                imgsz=640,
-                conf=0.25,
-                verbose=False,
-                padding_px=2,
-                pixel_size=10,
-                save=True
-            )
-            
-            # Rename the output file to match our naming convention
-            # yolo_e.py saves with "_output" suffix, so we need to find and rename it
-            # The actual pattern is: {original_filename_without_ext}_output{ext}
-            original_name = Path(file.filename).stem
-            original_ext = Path(file.filename).suffix
-            expected_output_pattern = f"{original_name}_output{original_ext}"
-            output_files = list(UPLOAD_DIR.glob(expected_output_pattern))
+            # Process image using yolo_e.py, in the worker pool
+            # The encoded result comes back in memory and goes straight to storage
+            num_detections, output_bytes = await run_in_worker(censor_worker.censor_image, str(input_path))
+            output_filename = f"{input_path.stem}_output{input_path.suffix}"
             
-            if output_files:
-                # Use the actual output file name instead of trying to rename
-                output_filename = output_files[0].name
-                output_path = output_files[0]
-                logger.info(f"Using output file: {output_filename}")
-            else:
-                logger.warning(f"Could not find output file with pattern: {expected_output_pattern}")
-                # List all files in upload directory for debugging
-                all_files = list(UPLOAD_DIR.glob("*"))
-                logger.info(f"Available files in upload directory: {[f.name for f in all_files]}")
-                # Fallback: use the expected output pattern as the filename
-                output_filename = expected_output_pattern
-                output_path = UPLOAD_DIR / expected_output_pattern
-            
-            message = f"Image processed successfully. Found {len(detections)} PII objects."
-            
-        else:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Unsupported file type. Supported: {', '.join(SUPPORTED_VIDEO_TYPES | SUPPORTED_IMAGE_TYPES)}"
-            )
+            message = f"Image processed successfully. Found {num_detections} PII objects."
         
         # Calculate processing time
         processing_time = time.time() - start_time
         
-        # Log memory usage after processing and cleanup
-        try:
-            import gc
-            import psutil
-            gc.collect()  # Force garbage collection
-            process = psutil.Process()
-            post_processing_memory = process.memory_info().rss / 1024 / 1024  # MB
+        # Log memory usage after processing (inference runs in the worker pool,
+        # so there is nothing here for a forced collection to free)
+        if _PROC and logger.isEnabledFor(logging.INFO):
+            post_processing_memory = _PROC.memory_info().rss / 1024 / 1024  # MB
             logger.info(f"📊 Memory after processing: {post_processing_memory:.1f} MB")
-        except ImportError:
-            pass
         
         # Upload to Supabase Storage (required for authenticated users)
         storage_info = None
@@ -463,24 +785,55 @@ async def process_file_endpoint(
             if not SUPABASE_AVAILABLE:
                 raise HTTPException(status_code=503, detail="Supabase Storage not available - authentication required")
             
-            if not output_path or not output_path.exists():
+            if output_bytes is None and not output_size:
                 raise HTTPException(status_code=500, detail="Processing failed - no output file generated")
             
+            if defer_upload:
+                _prune_upload_jobs()
+                upload_jobs[file_id] = {
+                    "job_id": file_id,
+                    "status": "uploading",
+                    "user_id": current_user["user_id"],
+                    "message": message,
+                    "file_type": file_type,
+                    "processing_time": processing_time,
+                    "created_at": time.time(),
+                }
+                background_tasks.add_task(
+                    _upload_and_cleanup, file_id, current_user["user_id"], file_type, output_filename,
+                    output_path=output_path, output_bytes=output_bytes,
+                )
+                _unlink_if_present(input_path)
+                return JSONResponse(status_code=202, content={
+                    "job_id": file_id,
+                    "status": "uploading",
+                    "message": message,
+                    "file_type": file_type,
+                    "processing_time": processing_time,
+                })
+            
             try:
                 # Upload to Supabase Storage
-                storage_info = await storage_service.upload_file(
-                    str(output_path), 
-                    current_user["user_id"], 
-                    "video" if is_video_file(file.filename) else "image"
-                )
+                if output_bytes is not None:
+                    storage_info = await storage_service.upload_bytes(
+                        output_bytes, output_filename, current_user["user_id"], "image"
+                    )
+                else:
+                    storage_info = await storage_service.upload_file(
+                        output_path, 
+                        current_user["user_id"], 
+                        file_type
+                    )
                 
                 if storage_info:
+                    _invalidate_user_files(current_user["user_id"])
                     logger.info(f"Successfully uploaded file to Supabase Storage for user {current_user['user_id']}")
                     logger.info(f"Public URL: {storage_info['public_url']}")
                     
                     # Clean up local file after successful upload
-                    output_path.unlink()
-                    logger.info(f"Cleaned up local file: {output_path}")
+                    if output_path:
+                        output_path.unlink()
+                        logger.info(f"Cleaned up local file: {output_path}")
                 else:
                     raise HTTPException(status_code=500, detail="Failed to upload file to Supabase Storage")
             except Exception as e:
@@ -491,8 +844,7 @@ async def process_file_endpoint(
             raise HTTPException(status_code=401, detail="Authentication required to process files")
         
         # Clean up input file
-        if input_path.exists():
-            input_path.unlink()
+        _unlink_if_present(input_path)
         
         # Use Supabase Storage URL (required)
         if not storage_info or not storage_info.get("public_url"):
@@ -505,7 +857,7 @@ async def process_file_endpoint(
             "message": message,
             "output_file": output_file,
             "download_url": download_url,
-            "file_type": "video" if is_video_file(file.filename) else "image",
+            "file_type": file_type,
             "processing_time": processing_time,
             "user_id": current_user["user_id"] if current_user else None,
             "storage_url": storage_info["public_url"] if storage_info else None
@@ -515,23 +867,34 @@ async def process_file_endpoint(
         logger.error(f"Error processing file: {str(e)}")
         # Clean up files on error
         try:
-            if input_path and input_path.exists():
-                input_path.unlink()
+            if _unlink_if_present(input_path):
                 logger.info(f"Cleaned up input file: {input_path}")
         except Exception as cleanup_error:
             logger.warning(f"Failed to cleanup input file: {cleanup_error}")
         
         try:
-            if output_path and output_path.exists():
-                output_path.unlink()
+            if _unlink_if_present(output_path):
                 logger.info(f"Cleaned up output file: {output_path}")
         except Exception as cleanup_error:
             logger.warning(f"Failed to cleanup output file: {cleanup_error}")
         
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
 # Note: Download endpoint removed - files are served directly from Supabase Storage
 
+@app.get("/jobs/{job_id}")
+async def get_upload_job(job_id: str, current_user: Optional[Dict[str, Any]] = Depends(get_current_user_optional)):
+    """Status of a deferred /process upload ("uploading", "done" with the download URL, or "failed")"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    job = upload_jobs.get(job_id)
+    if not job or job["user_id"] != current_user["user_id"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {k: v for k, v in job.items() if k != "created_at"}
+
 @app.get("/files")
 async def list_files(current_user: Optional[Dict[str, Any]] = Depends(get_current_user_optional)):
     """List processed files - requires authentication and Supabase Storage"""
@@ -542,7 +905,7 @@ async def list_files(current_user: Optional[Dict[str, Any]] = Depends(get_curren
         raise HTTPException(status_code=503, detail="Supabase Storage not available")
     
     try:
-        user_files = await storage_service.list_user_files(current_user["user_id"])
+        user_files = await _list_user_files(current_user["user_id"])
         return {"files": user_files}
     except Exception as e:
         logger.error(f"Error fetching user files from Supabase Storage: {str(e)}")
@@ -578,12 +941,15 @@ async def get_user_stats(current_user: Dict[str, Any] = Depends(get_current_user
     
     try:
         # Get user files from Supabase Storage
-        user_files = await storage_service.list_user_files(current_user["user_id"])
+        user_files = await _list_user_files(current_user["user_id"])
         
-        # Calculate stats from storage files
+        # Calculate stats from storage files, in one pass
         total_files = len(user_files)
-        images_processed = len([f for f in user_files if f.get('filename', '').lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp'))])
-        videos_processed = len([f for f in user_files if f.get('filename', '').lower().endswith(('.mp4', '.avi', '.mov', '.webm'))])
+        images_processed = videos_processed = 0
+        for f in user_files:
+            kind = file_kind(f.get('filename', ''))
+            images_processed += kind == "image"
+            videos_processed += kind == "video"
         
         stats = {
             "total_files": total_files,
@@ -608,7 +974,7 @@ async def get_user_files(current_user: Dict[str, Any] = Depends(get_current_user
         raise HTTPException(status_code=503, detail="Supabase Storage not available")
     
     try:
-        files = await storage_service.list_user_files(current_user["user_id"])
+        files = await _list_user_files(current_user["user_id"])
         return {"files": files}
     except Exception as e:
         logger.error(f"Error getting user files: {str(e)}")
@@ -629,11 +995,11 @@ async def delete_user_account(current_user: Dict[str, Any] = Depends(get_current
         # Delete all user files from Supabase Storage
         try:
             user_files = await storage_service.list_user_files(user_id)
-            for file_info in user_files:
-                file_path = file_info.get('path')
-                if file_path:
-                    await storage_service.delete_file(file_path)
-            logger.info(f"Deleted {len(user_files)} files for user {user_id}")
+            deleted = await storage_service.delete_files(
+                [file_info['path'] for file_info in user_files if file_info.get('path')]
+            )
+            _invalidate_user_files(user_id)
+            logger.info(f"Deleted {deleted} files for user {user_id}")
         except Exception as e:
             logger.warning(f"Error deleting user files: {str(e)}")
         
@@ -641,9 +1007,9 @@ async def delete_user_account(current_user: Dict[str, Any] = Depends(get_current
         try:
             if db_service:
                 # Delete user preferences
-                db_service.supabase.table("user_preferences").delete().eq("user_id", user_id).execute()
+                await run_in_threadpool(db_service.supabase.table("user_preferences").delete().eq("user_id", user_id).execute)
                 # Delete user profile
-                db_service.supabase.table("user_profiles").delete().eq("user_id", user_id).execute()
+                await run_in_threadpool(db_service.supabase.table("user_profiles").delete().eq("user_id", user_id).execute)
                 logger.info(f"Deleted user profile and preferences for user {user_id}")
         except Exception as e:
             logger.warning(f"Error deleting user database records: {str(e)}")
@@ -651,7 +1017,7 @@ async def delete_user_account(current_user: Dict[str, Any] = Depends(get_current
         # Delete the user from Supabase Auth (this requires service role key)
         try:
             # Use the admin client to delete the user from auth
-            auth_response = supabase_config.client.auth.admin.delete_user(user_id)
+            auth_response = await run_in_threadpool(supabase_config.client.auth.admin.delete_user, user_id)
             logger.info(f"Deleted user from Supabase Auth: {user_id}")
         except Exception as e:
             logger.warning(f"Error deleting user from Supabase Auth: {str(e)}")
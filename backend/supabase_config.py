@@ -2,7 +2,9 @@
 Supabase configuration and client setup for backend
 """
 import os
-from supabase import create_client, Client
+import httpx
+from supabase import create_client, Client, ClientOptions
+from storage3 import SyncStorageClient
 from dotenv import load_dotenv
 import logging
 
@@ -11,6 +13,15 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Shared HTTP pool for auth and PostgREST calls; storage has a pool of its own
+HTTP_MAX_KEEPALIVE = 50
+HTTP_MAX_CONNECTIONS = 200
+HTTP_TIMEOUT = 5.0
+# Storage uploads carry videos of up to 25MB, which take far longer than
+# HTTP_TIMEOUT to send (and to be acknowledged) on a slow link
+STORAGE_READ_TIMEOUT = 60.0
+STORAGE_WRITE_TIMEOUT = 300.0
+
 class SupabaseConfig:
     def __init__(self):
         self.url = os.getenv("SUPABASE_URL")
@@ -19,7 +30,24 @@ class SupabaseConfig:
         if not self.url or not self.key:
             raise ValueError("Missing Supabase environment variables. Please set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY")
         
-        self.client: Client = create_client(self.url, self.key)
+        # One long-lived keepalive pool instead of a fresh connection (DNS, TCP, TLS) per call
+        limits = httpx.Limits(max_keepalive_connections=HTTP_MAX_KEEPALIVE, max_connections=HTTP_MAX_CONNECTIONS)
+        self.http_client = httpx.Client(http2=True, limits=limits, timeout=httpx.Timeout(HTTP_TIMEOUT))
+        self.client: Client = create_client(self.url, self.key, options=ClientOptions(httpx_client=self.http_client))
+        
+        # Storage gets its own pool: uploads need the longer timeouts, and
+        # storage3 re-bases the client it is given onto the storage URL, which
+        # would send the PostgREST calls sharing it to the wrong service
+        self.storage_http_client = httpx.Client(
+            http2=True,
+            limits=limits,
+            timeout=httpx.Timeout(HTTP_TIMEOUT, read=STORAGE_READ_TIMEOUT, write=STORAGE_WRITE_TIMEOUT),
+        )
+        self.storage = SyncStorageClient(
+            str(self.client.storage_url), self.client.options.headers, http_client=self.storage_http_client
+        )
+        # Make client.storage this client too, rather than one built lazily on the shared pool
+        self.client._storage = self.storage
         logger.info("Supabase client initialized successfully")
 
     def get_client(self) -> Client:
@@ -37,6 +65,25 @@ class SupabaseConfig:
             logger.error(f"Supabase connection test failed: {str(e)}")
             return False
 
+    def warm(self) -> None:
+        """Open pooled connections to the auth, database and storage endpoints before the first request"""
+        try:
+            self.client.auth.get_user("warm")
+        except Exception:
+            pass  # an invalid token is expected; the connection is what we want
+        try:
+            self.client.table("user_profiles").select("id").limit(0).execute()
+            # the storage client has its own pool; open it too
+            self.storage.list_buckets()
+            logger.info("Supabase connection pool warmed")
+        except Exception as e:
+            logger.warning(f"Supabase warm-up failed: {str(e)}")
+
+    def close(self) -> None:
+        """Close the pooled connections (on shutdown)"""
+        self.http_client.close()
+        self.storage_http_client.close()
+
 # Global Supabase instance
 supabase_config = SupabaseConfig()
 supabase_client = supabase_config.get_client()
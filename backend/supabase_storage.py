@@ -2,15 +2,20 @@
 Supabase Storage service for file management
 """
 from supabase_config import supabase_client
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Union
 import logging
+import os
 import uuid
 from pathlib import Path
 import tempfile
+import asyncio
 import shutil
 
 logger = logging.getLogger(__name__)
 
+# Paths per Storage remove() call when deleting in bulk
+REMOVE_BATCH_SIZE = 1000
+
 class SupabaseStorageService:
     def __init__(self):
         self.supabase = supabase_client
@@ -46,88 +51,124 @@ class SupabaseStorageService:
             logger.error(f"Error creating storage bucket: {str(e)}")
             return False
 
-    async def upload_file(self, file_path: str, user_id: str, file_type: str) -> Optional[Dict[str, Any]]:
-        """Upload a file to Supabase Storage"""
+    async def upload_file(self, file_path: Union[str, Path], user_id: str, file_type: str) -> Optional[Dict[str, Any]]:
+        """Upload a file to Supabase Storage, streamed from disk rather than read into memory"""
         try:
-            # Create user-specific folder structure
-            folder_path = f"{user_id}/{file_type}"
-            
-            # Generate unique filename
-            file_name = Path(file_path).name
-            unique_filename = f"{uuid.uuid4()}_{file_name}"
-            
-            # Upload file
-            with open(file_path, 'rb') as file_data:
-                result = self.supabase.storage.from_(self.bucket_name).upload(
-                    path=f"{folder_path}/{unique_filename}",
-                    file=file_data,
-                    file_options={
-                        "content-type": self._get_content_type(file_name),
-                        "upsert": "true"  # Overwrite if exists
-                    }
-                )
-            
-            if result:
-                # Get public URL
-                public_url = self.supabase.storage.from_(self.bucket_name).get_public_url(
-                    f"{folder_path}/{unique_filename}"
-                )
-                
-                logger.info(f"Uploaded file to Supabase Storage: {unique_filename}")
-                
-                return {
-                    "filename": unique_filename,
-                    "path": f"{folder_path}/{unique_filename}",
-                    "public_url": public_url,
-                    "size": Path(file_path).stat().st_size
-                }
-            else:
-                logger.error("Failed to upload file to Supabase Storage")
-                return None
-                
+            return await asyncio.to_thread(self._upload_path, file_path, user_id, file_type)
+        except Exception as e:
+            logger.error(f"Error uploading file to Supabase Storage: {str(e)}")
+            return None
+
+    async def upload_bytes(self, data: bytes, file_name: str, user_id: str, file_type: str) -> Optional[Dict[str, Any]]:
+        """Upload in-memory file contents to Supabase Storage as `file_name`, without a local file"""
+        try:
+            # The client is synchronous: upload in a thread so the event loop stays free
+            return await asyncio.to_thread(self._upload, data, file_name, len(data), user_id, file_type)
         except Exception as e:
             logger.error(f"Error uploading file to Supabase Storage: {str(e)}")
             return None
 
+    def _upload_path(self, file_path: Union[str, Path], user_id: str, file_type: str) -> Optional[Dict[str, Any]]:
+        """Blocking upload of the file at `file_path`; run via asyncio.to_thread"""
+        file_path = Path(file_path)
+        # Hand the client the open file (a BufferedReader), which it sends as a
+        # chunked multipart body; bytes would mean holding the whole video in memory
+        with file_path.open('rb') as file_data:
+            return self._upload(file_data, file_path.name, os.fstat(file_data.fileno()).st_size, user_id, file_type)
+
+    def _upload(self, file_data, file_name: str, size: int, user_id: str, file_type: str) -> Optional[Dict[str, Any]]:
+        """Upload `file_data` (bytes or binary file) under the user's folder; storage info, or None"""
+        # Create user-specific folder structure
+        folder_path = f"{user_id}/{file_type}"
+        
+        # Generate unique filename
+        unique_filename = f"{uuid.uuid4()}_{file_name}"
+        
+        # Upload file
+        result = self.supabase.storage.from_(self.bucket_name).upload(
+            path=f"{folder_path}/{unique_filename}",
+            file=file_data,
+            file_options={
+                "content-type": self._get_content_type(file_name),
+                "upsert": "true"  # Overwrite if exists
+            }
+        )
+        
+        if result:
+            # Get public URL
+            public_url = self.supabase.storage.from_(self.bucket_name).get_public_url(
+                f"{folder_path}/{unique_filename}"
+            )
+            
+            logger.info(f"Uploaded file to Supabase Storage: {unique_filename}")
+            
+            return {
+                "filename": unique_filename,
+                "path": f"{folder_path}/{unique_filename}",
+                "public_url": public_url,
+                "size": size
+            }
+        else:
+            logger.error("Failed to upload file to Supabase Storage")
+            return None
+
     async def delete_file(self, file_path: str) -> bool:
         """Delete a file from Supabase Storage"""
         try:
-            result = self.supabase.storage.from_(self.bucket_name).remove([file_path])
+            result = await asyncio.to_thread(self.supabase.storage.from_(self.bucket_name).remove, [file_path])
             logger.info(f"Deleted file from Supabase Storage: {file_path}")
             return True
         except Exception as e:
             logger.error(f"Error deleting file from Supabase Storage: {str(e)}")
             return False
 
+    async def delete_files(self, file_paths: List[str]) -> int:
+        """Delete files from Supabase Storage with one remove() call per REMOVE_BATCH_SIZE paths; returns how many were removed"""
+        deleted = 0
+        for i in range(0, len(file_paths), REMOVE_BATCH_SIZE):
+            batch = file_paths[i:i + REMOVE_BATCH_SIZE]
+            try:
+                await asyncio.to_thread(self.supabase.storage.from_(self.bucket_name).remove, batch)
+                deleted += len(batch)
+            except Exception as e:
+                logger.error(f"Error deleting {len(batch)} files from Supabase Storage: {str(e)}")
+        logger.info(f"Deleted {deleted} files from Supabase Storage")
+        return deleted
+
     async def list_user_files(self, user_id: str) -> list:
         """List all files for a specific user"""
         try:
-            # List files in user's folder
-            result = self.supabase.storage.from_(self.bucket_name).list(
-                path=user_id,
-                options={"limit": 1000}
-            )
-            
-            files = []
-            for item in result:
-                if item.get('name'):  # Skip folders
-                    file_path = f"{user_id}/{item['name']}"
-                    public_url = self.supabase.storage.from_(self.bucket_name).get_public_url(file_path)
-                    
-                    files.append({
-                        "filename": item['name'],
-                        "path": file_path,
-                        "public_url": public_url,
-                        "size": item.get('metadata', {}).get('size', 0),
-                        "created_at": item.get('created_at'),
-                        "updated_at": item.get('updated_at')
-                    })
-            
-            return files
+            return await self.fetch_user_files(user_id)
         except Exception as e:
             logger.error(f"Error listing user files: {str(e)}")
             return []
 
+    async def fetch_user_files(self, user_id: str) -> list:
+        """list_user_files, but raising on errors instead of returning an empty list"""
+        # List files in user's folder
+        result = await asyncio.to_thread(
+            self.supabase.storage.from_(self.bucket_name).list,
+            path=user_id,
+            options={"limit": 1000}
+        )
+        
+        files = []
+        for item in result:
+            if item.get('name'):  # Skip folders
+                file_path = f"{user_id}/{item['name']}"
+                public_url = self.supabase.storage.from_(self.bucket_name).get_public_url(file_path)
+                
+                files.append({
+                    "filename": item['name'],
+                    "path": file_path,
+                    "public_url": public_url,
+                    "size": item.get('metadata', {}).get('size', 0),
+                    "created_at": item.get('created_at'),
+                    "updated_at": item.get('updated_at')
+                })
+        
+        return files
+
     def _get_content_type(self, filename: str) -> str:
         """Get content type based on file extension"""
         ext = Path(filename).suffix.lower()
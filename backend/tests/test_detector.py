@@ -0,0 +1,125 @@
+"""
+Regex PII classification and video cleanup in detector.py. Run from backend/:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+import regex
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detector
+from detector import PATTERNS, PATTERNS_FUZZY, _regex_class, looks_sensitive
+
+
+def priority_label(text, patterns):
+    """The label a per-pattern loop in dict order gives (the reference behaviour)"""
+    return next((label for label, pat in patterns.items() if pat.search(text)), None)
+
+
+class RegexLabelTest(unittest.TestCase):
+    def test_strict_labels_follow_priority_order(self):
+        self.assertEqual(_regex_class("S1234567D"), "phone")
+        self.assertEqual(_regex_class("ID 12345 a@b.co"), "email")
+        self.assertEqual(_regex_class("4111 1111 1111 1111"), "credit_card")
+        self.assertEqual(_regex_class("ABC1"), "alphanum")
+
+    def test_fuzzy_labels_follow_priority_order(self):
+        self.assertEqual(_regex_class("Order 4111 1111 1111 1111", True), "credit_card")
+        self.assertEqual(_regex_class("ID 12345 a@b.co", True), "email")
+
+    def test_combined_matches_per_pattern_loop(self):
+        texts = [
+            "S1234567D", "ID 12345 a@b.co", "Order 4111 1111 1111 1111",
+            "call +65 9123 4567", "john.doe@example.com", "ABC1", "2024",
+            "Menu", "", "T0123456J", "00:1A:2B:3C:4D:5E", "192.168.0.1",
+        ]
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertEqual(_regex_class(text), priority_label(text, PATTERNS))
+                self.assertEqual(_regex_class(text, True), priority_label(text, PATTERNS_FUZZY))
+
+    def test_blank_text_is_not_sensitive(self):
+        self.assertIsNone(looks_sensitive("   "))
+
+
+class FuzzyPatternTest(unittest.TestCase):
+    COMMON_WORDS = [
+        "Menu", "Total", "Exit", "EXIT", "OPEN", "Coffee", "hello world",
+        "Welcome to Singapore", "Thank you", "Parking", "Restaurant",
+        "RESTAURANT", "No Smoking", "CAUTION", "Level 3",
+    ]
+
+    def test_fuzzy_patterns_compile_as_fuzzy(self):
+        # regex V1 syntax: the {e<=k} budgets must be honoured, not rejected
+        for label, pat in PATTERNS_FUZZY.items():
+            with self.subTest(label=label):
+                self.assertTrue(pat.flags & regex.V1)
+        self.assertEqual(_regex_class("4111 1111 1111 111l", True), "credit_card")
+        self.assertEqual(_regex_class("john.d0e@exampl3.com", True), "email")
+
+    def test_common_words_are_not_flagged(self):
+        for word in self.COMMON_WORDS:
+            with self.subTest(word=word):
+                self.assertIsNone(_regex_class(word))
+                self.assertIsNone(_regex_class(word, True))
+                self.assertIsNone(looks_sensitive(word, fuzzy=True))
+
+    def test_email_needs_at_and_dot(self):
+        self.assertIsNone(_regex_class("johnexample.com", True))
+        self.assertIsNone(_regex_class("john@example", True))
+
+
+class FakeReader:
+    """Stands in for the EasyOCR reader: finds no text"""
+    def readtext_batched(self, frames, **kwargs):
+        return [[] for _ in frames]
+
+
+class VideoAbortTest(unittest.TestCase):
+    FRAMES = 24
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.input_path = os.path.join(self.tmp.name, "in.mp4")
+        self.output_path = os.path.join(self.tmp.name, "out.mp4")
+        writer = cv2.VideoWriter(self.input_path, cv2.VideoWriter_fourcc(*"mp4v"), 10, (64, 48))
+        for i in range(self.FRAMES):
+            writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+        writer.release()
+
+    def run_failing_encode(self):
+        """process_video_consistent with a redaction step that fails mid-video"""
+        calls = []
+
+        def censor(frame, *args, **kwargs):
+            calls.append(1)
+            if len(calls) > self.FRAMES // 2:
+                raise RuntimeError("redaction failed")
+            return frame
+
+        with mock.patch.object(detector, "get_reader", FakeReader), \
+             mock.patch.object(detector, "censor_frame_consistent", censor):
+            with self.assertRaisesRegex(RuntimeError, "redaction failed"):
+                detector.process_video_consistent(self.input_path, self.output_path, batch_size=4)
+        self.assertGreater(len(calls), 1)
+        self.assertFalse(os.path.exists(self.output_path))
+
+    @unittest.skipUnless(detector.AV_AVAILABLE, "PyAV not installed")
+    def test_av_writer_failure_removes_output(self):
+        self.run_failing_encode()
+
+    def test_cv2_writer_failure_removes_output(self):
+        with mock.patch.object(detector, "AV_AVAILABLE", False):
+            self.run_failing_encode()
+
+
+if __name__ == "__main__":
+    unittest.main()